@@ -1,13 +1,22 @@
 # Source: https://github.com/SNU-IntelligentMotionLab/SNU_ComputerGraphics_/blob/main/main.py
 # This script is based on above repository and adjusted for additional functionalities
 
+import argparse
 import pyglet 
 from pyglet.gl import *
-import numpy as np
-from scripts.rail import Rail, Cart
-from scripts.spline import NatCubeSpline
+from scripts.rail import Rail, TrainSet
+from scripts.spline import NatCubeSpline, SplineCursor
+from scripts.recorder import TrajectoryRecorder, TrajectoryReader
+from scripts.loader import load_track, DEFAULT_TRACK, TRACK_HELP
+from scripts.frames import quat_to_frame
 from scripts import camera, utils
 
+parser = argparse.ArgumentParser(description="Roller-Moonster")
+parser.add_argument("--track", help=TRACK_HELP)
+parser.add_argument("--record", help="save every tick of the ride to this file")
+parser.add_argument("--replay", help="play back a ride saved with --record instead of simulating")
+args = parser.parse_args()
+
 
 width  = 1500
 height = 1000
@@ -18,6 +27,7 @@ groundBatch = pyglet.graphics.Batch()
 railBatch = pyglet.graphics.Batch()
 event = utils.EventWatcher()
 counter=utils.TimeCounter(0)
+ride_clock=utils.TimeCounter(0) # time of the recording, only ever goes forward, also over resets
 
 ground = pyglet.image.load('texture/ground2.png')
 ground_1 = pyglet.sprite.Sprite(img=ground, x=0, y=0, z=-4, batch=groundBatch)
@@ -39,7 +49,7 @@ ground_4.rotation = -90
 print("\n-------------------------------Instructions-------------------------------")
 print("[P]: Start/Pause simulation")
 print("[R]: Reset simulation to initial state")
-print("[F]: Switch between Modified Frenet Frame and Head-up Frame")
+print("[F]: Cycle through Modified Frenet Frame, Head-up Frame and Rotation Minimizing Frame")
 print("[1]: Switch to 'first person view'(ride a roller coaster)")
 print("[3]: Switch to 'third person view' (external camera with trackball control)")
 print("--------------------------------------------------------------------------")
@@ -53,6 +63,8 @@ def on_resize(width, height):
 def on_draw():
 	window.clear()
 	camera.apply(window)
+	rail.update_lod(camera.eye()) # coarser rail chunks far from the camera
+	rail.cull(window.projection @ window.view) # only rail chunks in view are drawn
 	groundBatch.draw()
 	railBatch.draw()
 
@@ -76,21 +88,17 @@ def on_key_press( key, mods ):
 			event.moving = True
 	
 	if key==pyglet.window.key.F:
-		print("\nGenerating new rails...Please wait")
-		
-		rail.switch_frame()
-		cart.switch_frame()
-		if rail.frame == "frenet_frame":
-			print("Successfully switched to 'Modified Frenet Frame'")
-		elif rail.frame == "up_frame":
-			print("Successfully switched to 'Head-Up Frame'")
+		rail.switch_frame() # instant if this frame was built before, else built in the background
+		if rail.pending is not None:
+			print("\nGenerating new rails in the background...")
 
 	if key==pyglet.window.key.R:
 		counter.reset()
 		event.moving = False
-		s.reset()
+		cursor.reset()
 		u.reset()
-		cart.move(u.value)
+		train.s = cursor.s
+		trains.move()
 
 @window.event
 def on_mouse_release( x, y, button, mods ):
@@ -132,51 +140,72 @@ def on_mouse_scroll(x, y, scroll_x, scroll_y):
 
 
 def update(dt):
+	# swap in rails built in the background, the train follows the rail's frame
+	rail.poll()
+	if trains.frame != rail.frame:
+		trains.switch_frame(rail.frame)
+		if rail.frame == "frenet_frame":
+			print("Successfully switched to 'Modified Frenet Frame'")
+		elif rail.frame == "up_frame":
+			print("Successfully switched to 'Head-Up Frame'")
+		elif rail.frame == "rmf_frame":
+			print("Successfully switched to 'Rotation Minimizing Frame'")
+
 	if event.moving:
 		counter.update_time(dt)
-
-		if s.value >= smax:
-			s.reset()
-		s.add(spline.speed(u.value) * dt)
-		u.value = spline.inv_length(s.value)
-		cart.move(u.value)
+		ride_clock.update_time(dt)
+
+		if replay is not None:
+			record = replay.at(counter.t)
+			u.value = float(record["u"])
+			train.s = float(record["s"])
+			# the camera as the rider saw it. frame y and z do not depend on the table's mirroring
+			frame = quat_to_frame(record["quat"]) if record["camera_riding"] else None
+			camera.set_pose(record["camera_translation"], record["camera_quat"], record["camera_dolly"], frame)
+		else:
+			if cursor.s >= smax:
+				cursor.reset()
+			cursor.advance(spline.speed(cursor.u) * dt)
+			u.value = cursor.u
+			train.s = cursor.s
+		trains.move()
 		
-	if event.thirdview == False:
+	if replay is not None and event.moving:
+		pass # the recorded camera
+	elif event.thirdview == False:
 		camera.follow_spline(spline, u.value, frame=rail.frame)
 	elif event.thirdview ==True:
 		camera.remember_thirdview()
 
+	if event.moving and recorder is not None:
+		table = spline.frame_table(trains.frame)
+		translation, quat, dolly = camera.pose()
+		recorder.append(ride_clock.t, train.s, u.value, spline.coordinates(u.value), table.lookup_quat(u.value),
+				  translation, quat, dolly, not event.thirdview)
+
 		
 		
-passing_points = np.array([
-    [0, 0, 0],
-    [-1, -2, 0],
-	[1, -2, -1],
-    [2, 2, 0],
-    [1, 3, 5],
-    [1, 2, 5],
-    [4, 1, 5],
-    [4.5, 1.5, 3],
-	[5, 4, 1],
-	[4.5, 6, 2],
-	[4, 4, 4],
-	[3.5, 4, 1],
-    [3, 6, 0],
-	[1, 5, -1],
-    [0, 0, 0]
-])
-
-# initialize spline, rail, and cart
+passing_points = DEFAULT_TRACK if args.track is None else load_track(args.track)
+
+# initialize spline, rail, and train
 frame = "frenet_frame"
-spline = NatCubeSpline(passing_points)
-rail = Rail(spline=spline, thickness=0.1, width = 1, n_cylinders=500, n_plates=50, batch=railBatch, frame=frame)
-cart = Cart(spline=spline, batch=railBatch, frame=frame)
+spline = NatCubeSpline(passing_points, cache_dir="cache") # precomputed data is reused from cache/
+rail = Rail(spline=spline, thickness=0.1, width = 1, tolerance=0.002, plate_spacing=0.9, batch=railBatch, frame=frame)
+trains = TrainSet(spline=spline, batch=railBatch, frame=frame)
+train = trains.add(n_cars=10, spacing=0.45) # the camera rides the front car
 
 # initialize simulation parameters
-s = utils.value(0)
+cursor = SplineCursor(spline) # walks along the track by arc length
 u = utils.value(0)
 tmax = 100 # Stop after 100 seconds
 smax = spline.length(spline.umax) # to reset length after 1 loop
+recorder = TrajectoryRecorder(args.record) if args.record else None
+try:
+	replay = TrajectoryReader(args.replay) if args.replay else None
+except ValueError as error:
+	parser.error(str(error))
+if replay is not None and len(replay) == 0:
+	parser.error(f"{args.replay} has no records to replay")
 
 pyglet.clock.schedule_interval(update, 1/120)
 glClearColor(0.529, 0.808, 0.922, 1.0)
@@ -185,4 +214,9 @@ glClearDepth(1.0)
 glDepthFunc(GL_LESS)
 
 camera.resize( window, width, height )	
-pyglet.app.run()
\ No newline at end of file
+try:
+	pyglet.app.run()
+finally:
+	# also on an error, so the recording so far stays readable
+	if recorder is not None:
+		recorder.close()
\ No newline at end of file
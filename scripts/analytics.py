@@ -0,0 +1,152 @@
+# Ride comfort analytics: what a rider feels along the whole track, in one vectorized pass.
+#
+#   python -m scripts.analytics --track points.csv --frame up_frame --limit vertical_g=5 --limit jerk=20
+#
+# Samples are spaced evenly in arc length. Speed follows spline.speeds (energy conservation), so
+# the tangential acceleration is v dv/ds = -g dz/ds and the centripetal one is v^2 d^2r/ds^2.
+# g-loads are the felt specific force (acceleration minus gravity) in units of g, in the cart frame:
+# lateral along x, vertical along y (seat normal), longitudinal along the tangent z.
+import argparse
+import sys
+import numpy as np
+from scripts.spline import NatCubeSpline
+from scripts.frames import FRAME_TYPES, rotation_minimizing_frames
+from scripts.loader import load_track, DEFAULT_TRACK, TRACK_HELP
+
+QUANTITIES = ["speed", "curvature", "torsion", "normal_g", "lateral_g", "vertical_g", "longitudinal_g", "jerk"]
+# limits every comfort_report checks, {quantity: threshold}. none unless set here or per report
+DEFAULT_LIMITS = {}
+
+
+def curvature(spline, u_array):
+    d1, d2 = spline.tangents(u_array), spline.normals(u_array)
+    speed = np.linalg.norm(d1, axis=-1)
+    return np.linalg.norm(np.cross(d1, d2), axis=-1) / np.maximum(speed, 1e-12)**3
+
+
+def torsion(spline, u_array):
+    d1, d2, d3 = spline.tangents(u_array), spline.normals(u_array), spline.third_derivatives(u_array)
+    b = np.cross(d1, d2)
+    b2 = np.einsum('...j,...j->...', b, b)
+    return np.divide(np.einsum('...j,...j->...', b, d3), b2, out=np.zeros_like(b2), where=b2 > 1e-18)
+
+
+# every quantity of QUANTITIES (plus s and u) at samples ds apart along the track.
+# ds defaults to a sixteenth of the mean segment length. rotation minimizing frames are carried
+# along these samples instead of looked up in the spline's frame table, which is denser
+def ride_profile(spline, frame="up_frame", ds=None, g=9.8):
+    total = spline.cumulative_lengths[-1]
+    if ds is None:
+        ds = total / (spline.N-1) / 16
+    n = max(int(np.ceil(total / ds)), 2) + 1
+    s = np.linspace(0, total, n)
+    u = spline.inv_length_many(s)
+    if spline.closed:
+        u[-1] = spline.umax  # inv_length_many wraps the end around to 0
+
+    d1, d2 = spline.tangents(u), spline.normals(u)
+    d1_norm = np.maximum(np.linalg.norm(d1, axis=-1, keepdims=True), 1e-12)
+    T = d1 / d1_norm
+    # d^2r/ds^2 = kappa N
+    r_ss = (d2 - np.einsum('ij,ij->i', d2, T)[:, np.newaxis]*T) / d1_norm**2
+
+    v = spline.speeds(u, g)
+    accel = -g*T[:, 2:3]*T + v[:, np.newaxis]**2 * r_ss
+    felt = accel + np.array([0, 0, g])
+
+    if frame == "rmf_frame":
+        # start upright and spread the twist of a loop evenly in u, like the frame table
+        y0 = spline.frames(u[0], "up_frame")[1]
+        frames = rotation_minimizing_frames(spline.coordinates(u), T, y0, closed=spline.closed,
+                                            spread=(u - spline.umin)/(spline.umax - spline.umin))
+    else:
+        frames = spline.frames(u, frame)
+    x, y, z = np.moveaxis(frames, -2, 0)
+    # jerk: d(accel)/dt = v d(accel)/ds
+    jerk = v * np.linalg.norm(np.gradient(accel, s, axis=0), axis=-1)
+
+    return {
+        "s": s,
+        "u": u,
+        "speed": v,
+        "curvature": curvature(spline, u),
+        "torsion": torsion(spline, u),
+        "normal_g": np.linalg.norm(v[:, np.newaxis]**2 * r_ss, axis=-1) / g,
+        "lateral_g": np.einsum('ij,ij->i', felt, x) / g,
+        "vertical_g": np.einsum('ij,ij->i', felt, y) / g,
+        "longitudinal_g": np.einsum('ij,ij->i', felt, z) / g,
+        "jerk": jerk / g,  # g per second
+    }
+
+
+# largest |value| of every quantity, with where it happens
+def peaks(profile, keys=QUANTITIES):
+    result = {}
+    for key in keys:
+        i = int(np.argmax(np.abs(profile[key])))
+        result[key] = (float(profile[key][i]), float(profile["s"][i]), float(profile["u"][i]))
+    return result
+
+
+# (s_start, s_end, peak) of every stretch where |profile[key]| > threshold
+def intervals_over(profile, key, threshold):
+    over = np.abs(profile[key]) > threshold
+    edges = np.diff(over.astype(np.int8), prepend=0, append=0)
+    starts = np.nonzero(edges == 1)[0]
+    ends = np.nonzero(edges == -1)[0]
+    if len(starts) == 0:
+        return []
+    values = np.abs(profile[key])
+    peak = np.maximum.reduceat(values, starts)
+    s = profile["s"]
+    return [(float(s[a]), float(s[b-1]), float(p)) for a, b, p in zip(starts, ends, peak)]
+
+
+# peaks of everything, intervals of the limited quantities. limits: {quantity: threshold}, on top of
+# DEFAULT_LIMITS
+def comfort_report(profile, limits=None):
+    limits = {**DEFAULT_LIMITS, **(limits or {})}
+    return {
+        "peaks": peaks(profile),
+        "violations": {key: intervals_over(profile, key, threshold) for key, threshold in limits.items()},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Curvature, torsion and g-load profile of a track")
+    parser.add_argument("--track", help=TRACK_HELP)
+    parser.add_argument("--frame", choices=FRAME_TYPES, default="up_frame")
+    parser.add_argument("--ds", type=float, default=None, help="sample spacing in arc length")
+    parser.add_argument("--gravity", type=float, default=9.8)
+    parser.add_argument("--limit", action="append", default=[], metavar="QUANTITY=VALUE",
+                        help="report where |QUANTITY| exceeds VALUE, exit with 1 if it does anywhere")
+    args = parser.parse_args(argv)
+
+    limits = {}
+    for item in args.limit:
+        key, equals, value = item.partition("=")
+        if not equals:
+            parser.error(f"--limit {item}: expected QUANTITY=VALUE")
+        if key not in QUANTITIES:
+            parser.error(f"unknown quantity {key}, choose from {', '.join(QUANTITIES)}")
+        try:
+            limits[key] = float(value)
+        except ValueError:
+            parser.error(f"--limit {item}: {value!r} is not a number")
+
+    points = DEFAULT_TRACK if args.track is None else load_track(args.track)
+    spline = NatCubeSpline(points)
+    report = comfort_report(ride_profile(spline, args.frame, args.ds, args.gravity), limits)
+
+    for key, (value, s, u) in report["peaks"].items():
+        print(f"{key:>15}: {value:10.4f} at s={s:.3f} (u={u:.3f})")
+    failed = False
+    for key, intervals in report["violations"].items():
+        for s0, s1, peak in intervals:
+            print(f"{key} over {limits[key]} from s={s0:.3f} to s={s1:.3f}, peak {peak:.4f}")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+# On-disk cache of precomputed arrays as uncompressed .npz files.
+# np.load cannot memory map the members of an .npz, but uncompressed members are plain .npy
+# files inside the zip, so they are mapped directly at their offset in the archive.
+import hashlib
+import os
+import zipfile
+import numpy as np
+
+CACHE_VERSION = 4  # bump when the cached layout or the algorithms behind it change
+
+
+# hex digest over the passing points and every parameter the cached data depends on
+def track_key(points, *params):
+    points = np.ascontiguousarray(points, dtype=float)
+    digest = hashlib.sha256()
+    digest.update(repr((CACHE_VERSION, points.shape) + params).encode())
+    digest.update(points.tobytes())
+    return digest.hexdigest()
+
+
+# write to a temporary file first, so readers never see half an archive
+def save_arrays(path, arrays):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, path)
+
+
+# {name: array}. arrays are memory mapped copy-on-write: edits stay in memory, the file is untouched
+def load_arrays(path):
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as f:
+        for info in archive.infolist():
+            name = info.filename[:-4] if info.filename.endswith(".npy") else info.filename
+            if info.compress_type != zipfile.ZIP_STORED:
+                arrays[name] = np.load(archive.open(info))
+                continue
+
+            # local file header: 30 bytes, then the file name and an extra field of given lengths
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = np.frombuffer(f.read(4), dtype="<u2")
+            f.seek(info.header_offset + 30 + int(name_length) + int(extra_length))
+            if np.lib.format.read_magic(f) == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+
+            if len(shape) == 0:
+                arrays[name] = np.load(archive.open(info))[()]
+            elif dtype.hasobject or int(np.prod(shape)) == 0:
+                arrays[name] = np.load(archive.open(info))
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode="c", offset=f.tell(), shape=shape,
+                                         order="F" if fortran_order else "C")
+    return arrays
@@ -68,13 +68,18 @@ def zoom( z ):
     dolly += 15.0*z
     
     
-def apply(window):
-    global tx, ty, tz
-    global dolly, curquat
-    
+def view_matrix():
     q = Quaternion(curquat[0],curquat[1],curquat[2],curquat[3])
-        
-    window.view =  rollermat @ Mat4.from_translation(Vec3(tx,ty,tz)) @ Mat4.from_translation(Vec3(0.0, 0.0, -dolly)) @ Quaternion.to_mat4(q)
+    return rollermat @ Mat4.from_translation(Vec3(tx,ty,tz)) @ Mat4.from_translation(Vec3(0.0, 0.0, -dolly)) @ Quaternion.to_mat4(q)
+
+
+def apply(window):
+    window.view = view_matrix()
+
+
+# camera position in world coordinates
+def eye():
+    return (~view_matrix()).column(3)[:3]
       
 
 def trackball( p1x, p1y, p2x, p2y ):
@@ -132,19 +137,34 @@ def follow_spline(spline, u, frame="up_frame"):
     global rollermat
     global dolly
 
-    if frame == "up_frame":
-        x, y, z = spline.up_frame(u)
-    if frame == "frenet_frame":
-        x, y, z = spline.frenet_frame(u)
+    x, y, z = spline.frame_table(frame).lookup(u)
 
-    rollermat = Mat4.look_at(Vec3(0, 0, 0), Vec3(*z), Vec3(*y)) @ Mat4.from_translation(-0.15*Vec3(*y)) @ Mat4.from_translation(-0.05*Vec3(*z))
+    rollermat = ride_matrix(y, z)
 
-    tx = -spline.coordinate(u)[0]
-    ty = -spline.coordinate(u)[1]
-    tz = -spline.coordinate(u)[2]
+    tx, ty, tz = -spline.coordinate(u)
     dolly = 0
     curquat = [1, 0, 0, 0]
 
+# view rotation of a camera riding a cart whose frame has y up and z forward
+def ride_matrix(y, z):
+    return Mat4.look_at(Vec3(0, 0, 0), Vec3(*z), Vec3(*y)) @ Mat4.from_translation(-0.15*Vec3(*y)) @ Mat4.from_translation(-0.05*Vec3(*z))
+
+# back to a pose(). frame: (x, y, z) of the cart the camera rode, None for the trackball camera
+def set_pose(translation, quat, distance, frame=None):
+    global tx, ty, tz
+    global curquat
+    global rollermat
+    global dolly
+
+    tx, ty, tz = (float(v) for v in translation)
+    curquat = [float(v) for v in quat]
+    dolly = float(distance)
+    rollermat = Mat4() if frame is None else ride_matrix(frame[1], frame[2])
+
+# current camera translation, trackball quaternion and dolly
+def pose():
+    return (tx, ty, tz), curquat, dolly
+
 def detach_spline():
     global curquat
     global dolly
@@ -0,0 +1,281 @@
+import numpy as np
+from scripts.utils import normalize_many
+
+FRAME_TYPES = ["frenet_frame", "up_frame", "rmf_frame"]
+TABLE_SAMPLES_PER_SEGMENT = 32  # frames sampled per spline segment in a FrameTable
+
+# quaternions are stored as [w, x, y, z], same as camera.py
+# a frame is stacked rows (x, y, z); its rotation matrix has those rows as columns
+
+def frame_to_quat(frames):
+    R = np.swapaxes(np.asarray(frames, dtype=float), -1, -2)
+    m00, m11, m22 = R[..., 0, 0], R[..., 1, 1], R[..., 2, 2]
+    trace = m00 + m11 + m22
+
+    # Shepperd's method: pick the largest of w, x, y, z to divide by
+    candidates = np.stack([trace, m00, m11, m22], axis=-1)
+    pick = np.argmax(candidates, axis=-1)
+    q = np.empty(R.shape[:-2] + (4,))
+
+    r = np.sqrt(np.maximum(1 + trace, 0)) * 2
+    w = pick == 0
+    q[w] = np.stack([r[w]/4,
+                     (R[w, 2, 1] - R[w, 1, 2]) / r[w],
+                     (R[w, 0, 2] - R[w, 2, 0]) / r[w],
+                     (R[w, 1, 0] - R[w, 0, 1]) / r[w]], axis=-1)
+    r = np.sqrt(np.maximum(1 + m00 - m11 - m22, 0)) * 2
+    x = pick == 1
+    q[x] = np.stack([(R[x, 2, 1] - R[x, 1, 2]) / r[x],
+                     r[x]/4,
+                     (R[x, 0, 1] + R[x, 1, 0]) / r[x],
+                     (R[x, 0, 2] + R[x, 2, 0]) / r[x]], axis=-1)
+    r = np.sqrt(np.maximum(1 - m00 + m11 - m22, 0)) * 2
+    y = pick == 2
+    q[y] = np.stack([(R[y, 0, 2] - R[y, 2, 0]) / r[y],
+                     (R[y, 0, 1] + R[y, 1, 0]) / r[y],
+                     r[y]/4,
+                     (R[y, 1, 2] + R[y, 2, 1]) / r[y]], axis=-1)
+    r = np.sqrt(np.maximum(1 - m00 - m11 + m22, 0)) * 2
+    z = pick == 3
+    q[z] = np.stack([(R[z, 1, 0] - R[z, 0, 1]) / r[z],
+                     (R[z, 0, 2] + R[z, 2, 0]) / r[z],
+                     (R[z, 1, 2] + R[z, 2, 1]) / r[z],
+                     r[z]/4], axis=-1)
+    return normalize_many(q)
+
+def quat_to_frame(q):
+    w, x, y, z = np.moveaxis(np.asarray(q, dtype=float), -1, 0)
+    R = np.stack([
+        np.stack([1 - 2*(y*y + z*z), 2*(x*y - z*w), 2*(x*z + y*w)], axis=-1),
+        np.stack([2*(x*y + z*w), 1 - 2*(x*x + z*z), 2*(y*z - x*w)], axis=-1),
+        np.stack([2*(x*z - y*w), 2*(y*z + x*w), 1 - 2*(x*x + y*y)], axis=-1),
+    ], axis=-2)
+    return np.swapaxes(R, -1, -2)
+
+# spherical interpolation between quaternion arrays, alpha in [0, 1]
+def slerp(q0, q1, alpha):
+    alpha = np.asarray(alpha, dtype=float)[..., np.newaxis]
+    dot = np.sum(q0*q1, axis=-1, keepdims=True)
+    q1 = np.where(dot < 0, -q1, q1)
+    dot = np.abs(dot)
+
+    theta = np.arccos(np.clip(dot, -1, 1))
+    sin_theta = np.sin(theta)
+    close = sin_theta < 1e-6
+    safe = np.where(close, 1, sin_theta)
+    w0 = np.where(close, 1 - alpha, np.sin((1 - alpha)*theta) / safe)
+    w1 = np.where(close, alpha, np.sin(alpha*theta) / safe)
+    return normalize_many(w0*q0 + w1*q1)
+
+# rotation minimizing frames by the double reflection method (Wang et al. 2008).
+# the y axis is carried along the curve, starting from y0. the double reflection of one sample to
+# the next is a rotation, so instead of carrying y through every step in turn, each step carries a
+# reference vector of its own sample, and the twist it picks up against the next sample's reference
+# is summed along the curve. the frames are kept as that angle of y from the reference, theta.
+# spread: how far around a closed curve (0 to 1) every sample is, evenly by sample if not given
+def rotation_minimizing_frames(points, tangents, y0, closed=False, spread=None):
+    points = np.asarray(points, dtype=float)
+    tangents = normalize_many(np.asarray(tangents, dtype=float))
+    ref = rmf_references(tangents)
+    theta = rmf_angles(points, tangents, ref, y0)
+    if closed and len(points) > 1:
+        # the frame carried around a loop comes back twisted. spread the twist evenly
+        spread = np.linspace(0, 1, len(points)) if spread is None else spread
+        theta = theta + closing_twist(tangents, ref, theta)*spread
+    return rmf_frames(tangents, ref, theta)
+
+
+# any vector normal to the tangent will do as reference; z unless the tangent is close to it
+def rmf_references(tangents):
+    axis = np.where(np.abs(tangents[:, 2:3]) < 0.9, [0.0, 0.0, 1.0], [1.0, 0.0, 0.0])
+    return normalize_many(axis - np.einsum('ij,ij->i', axis, tangents)[:, np.newaxis]*tangents)
+
+
+def _reflect(v, n, c):
+    k = np.divide(2*np.einsum('ij,ij->i', n, v), c, out=np.zeros_like(c), where=c > 0)
+    return v - k[:, np.newaxis]*n
+
+
+def _signed_angle(a, b, axis):
+    return np.arctan2(np.einsum('ij,ij->i', np.cross(a, b), axis), np.einsum('ij,ij->i', a, b))
+
+
+# twist of every step from sample 0 to sample 1: the angle about t1 from ref1 to ref0 carried over
+def rmf_steps(p0, t0, ref0, p1, t1, ref1):
+    # reflect across the bisector plane of the two points, then again so the tangent lands on the next
+    v1 = p1 - p0
+    c1 = np.einsum('ij,ij->i', v1, v1)
+    rL, tL = _reflect(ref0, v1, c1), _reflect(t0, v1, c1)
+    v2 = t1 - tL
+    return _signed_angle(ref1, _reflect(rL, v2, np.einsum('ij,ij->i', v2, v2)), t1)
+
+
+# theta of y carried along from y0
+def rmf_angles(points, tangents, ref, y0):
+    steps = rmf_steps(points[:-1], tangents[:-1], ref[:-1], points[1:], tangents[1:], ref[1:])
+    start = _signed_angle(ref[:1], np.asarray(y0, dtype=float)[np.newaxis], tangents[:1])
+    return start + np.concatenate([[0.0], np.cumsum(steps)])
+
+
+# angle about the first tangent from the last y to the first, for frames at theta
+def closing_twist(tangents, ref, theta):
+    y = rmf_frames(tangents[[0, -1]], ref[[0, -1]], theta[[0, -1]])[:, 1]
+    return float(np.arctan2(np.dot(np.cross(y[1], y[0]), tangents[0]), np.dot(y[1], y[0])))
+
+
+def rmf_frames(tangents, ref, theta):
+    y = np.cos(theta)[:, np.newaxis]*ref + np.sin(theta)[:, np.newaxis]*np.cross(tangents, ref)
+    x = normalize_many(np.cross(y, tangents))
+    return np.stack((x, y, tangents), axis=-2)
+
+
+# turn the frames of quats about their own z axes in place, frame j by angle + step*j, or by
+# angle[j] for an array of angles: q * (cos a/2, 0, 0, sin a/2) = q cos a/2 + (-z, y, -x, w) sin a/2.
+# in blocks, so the temporaries stay small on long tables
+def _turn_about_z(quats, angle, step=0.0, block=1 << 14):
+    angle = np.asarray(angle, dtype=float)
+    if angle.ndim == 0:
+        # cos and sin of a + step*j by the sum formulas, from one table of step*j for all blocks
+        half = step*np.arange(min(block, len(quats)))[:, np.newaxis]/2
+        cos_j, sin_j = np.cos(half), np.sin(half)
+    for start in range(0, len(quats), block):
+        q = quats[start:start+block]
+        if angle.ndim == 0:
+            a = (angle + step*start)/2
+            c = np.cos(a)*cos_j[:len(q)] - np.sin(a)*sin_j[:len(q)]
+            s = np.sin(a)*cos_j[:len(q)] + np.cos(a)*sin_j[:len(q)]
+        else:
+            half = angle[start:start+block, np.newaxis]/2
+            c, s = np.cos(half), np.sin(half)
+        turned = q[:, ::-1] * (s * np.array([-1.0, 1.0, -1.0, 1.0]))
+        q *= c
+        q += turned
+
+
+# frames sampled once per spline, stored as quaternions and looked up with slerp
+class FrameTable:
+    # arrays: the result of arrays() of an earlier table of the same spline, used instead of building
+    def __init__(self, spline, frame="rmf_frame", samples_per_segment=TABLE_SAMPLES_PER_SEGMENT, arrays=None):
+        self.spline = spline
+        self.frame = frame
+        self.samples_per_segment = samples_per_segment
+        # rotation minimizing tables keep the angles of their frames, see rotation_minimizing_frames
+        self.theta, self.twist = None, 0.0
+        if arrays is None:
+            self.build()
+        else:
+            self.u, self.quats, self.mirror = arrays["u"], arrays["quats"], bool(arrays["mirror"])
+            self.samples_per_segment = int(arrays["samples_per_segment"])
+            if "theta" in arrays:
+                self.theta, self.twist = arrays["theta"], float(arrays["twist"])
+
+    def arrays(self):
+        arrays = {"u": self.u, "quats": self.quats, "mirror": self.mirror, "samples_per_segment": self.samples_per_segment}
+        if self.theta is not None:
+            arrays.update(theta=self.theta, twist=self.twist)
+        return arrays
+
+    def build(self):
+        spline = self.spline
+        self.u = np.linspace(spline.umin, spline.umax, (spline.N-1)*self.samples_per_segment + 1)
+
+        if self.frame == "rmf_frame":
+            tangents = normalize_many(spline.tangents(self.u))
+            ref = rmf_references(tangents)
+            # start upright, like the up frame
+            y0 = spline.frames(self.u[0], "up_frame")[1]
+            self.theta = rmf_angles(spline.coordinates(self.u), tangents, ref, y0)
+            self.twist = closing_twist(tangents, ref, self.theta) if spline.closed else 0.0
+            frames = rmf_frames(tangents, ref, self.angles())
+        else:
+            frames = spline.frames(self.u, self.frame)
+
+        # the modified frenet frame is left handed. mirror x so it fits in a rotation
+        self.mirror = np.sum(np.linalg.det(frames)) < 0
+        if self.mirror:
+            frames[..., 0, :] *= -1
+
+        quats = frame_to_quat(frames)
+        # keep neighbours in the same hemisphere so slerp takes the short way
+        flip = np.cumsum(np.sum(quats[1:]*quats[:-1], axis=-1) < 0) % 2 == 1
+        quats[1:][flip] *= -1
+        self.quats = quats
+
+    # theta of a rotation minimizing table with the closing twist spread evenly around the loop
+    def angles(self, i0=0, i1=None):
+        i1 = len(self.theta) if i1 is None else i1
+        return self.theta[i0:i1] + self.twist*np.arange(i0, i1)/(len(self.theta) - 1)
+
+    # samples [i0, i1) of every (u0, u1) range
+    def _spans(self, ranges):
+        return [(int(round(u0 * self.samples_per_segment)), int(round(u1 * self.samples_per_segment)) + 1)
+                for u0, u1 in ranges]
+
+    # resample the frames of the (u0, u1) ranges after the spline changed there
+    def update(self, ranges):
+        if self.frame == "rmf_frame":
+            if self.theta is None:
+                self.build()  # a table from an older cache, without its angles
+                return
+            self._turn_rmf(ranges)
+        for i0, i1 in self._spans(ranges):
+            if self.frame == "rmf_frame":
+                tangents = normalize_many(self.spline.tangents(self.u[i0:i1]))
+                frames = rmf_frames(tangents, rmf_references(tangents), self.angles(i0, i1))
+            else:
+                frames = self.spline.frames(self.u[i0:i1], self.frame)
+            if self.mirror:
+                frames[..., 0, :] *= -1
+            quats = frame_to_quat(frames)
+            previous = self.quats[i0-1:i0] if i0 > 0 else quats[:1]
+            flip = np.cumsum(np.sum(quats*np.concatenate([previous, quats[:-1]]), axis=-1) < 0) % 2 == 1
+            quats[flip] *= -1
+            self.quats[i0:i1] = quats
+
+    # rotation minimizing frames depend on the whole track before them. the steps into and out of
+    # the changed samples are measured again and theta summed over them; every later frame (on a
+    # loop, with the new closing twist, every frame) only turns about its tangent, which is a
+    # product with a rotation about z instead of a new conversion
+    def _turn_rmf(self, ranges):
+        spline, M = self.spline, len(self.u)
+        changed = np.concatenate([np.arange(i0, i1) for i0, i1 in self._spans(ranges)])
+        k = np.unique(np.clip(np.concatenate([changed - 1, changed]), 0, M - 2))
+        at = np.unique(np.concatenate([k, k + 1, [0, M - 1]]))
+        points = spline.coordinates(self.u[at])
+        tangents = normalize_many(spline.tangents(self.u[at]))
+        ref = rmf_references(tangents)
+        i, j = np.searchsorted(at, k), np.searchsorted(at, k + 1)
+
+        # theta[k0:k1+2] follow the steps k0..k1, the rest of the track turns with theta[k1+1]
+        k0, k1 = k[0], k[-1]
+        theta, old = self.theta, np.array(self.theta[k0:k1+2])
+        steps = np.diff(old)
+        steps[k - k0] = rmf_steps(points[i], tangents[i], ref[i], points[j], tangents[j], ref[j])
+        if k0 == 0 and changed.min() == 0:
+            y0 = spline.frames(self.u[0], "up_frame")[1]
+            theta[0] = rmf_angles(points[:1], tangents[:1], ref[:1], y0)[0]
+        theta[k0+1:k1+2] = theta[k0] + np.cumsum(steps)
+        turn = theta[k1+1] - old[-1]
+        theta[k1+2:] += turn
+        twist = self.twist
+        if spline.closed:
+            self.twist = closing_twist(tangents[[0, -1]], ref[[0, -1]], theta[[0, -1]])
+        spread = (self.twist - twist)/(M - 1)  # change of the closing twist per sample
+
+        if spread != 0:
+            _turn_about_z(self.quats[:k0], 0.0, spread)
+        _turn_about_z(self.quats[k0:k1+2], theta[k0:k1+2] - old + spread*np.arange(k0, k1 + 2))
+        _turn_about_z(self.quats[k1+2:], turn + spread*(k1 + 2), spread)
+
+    # rotation at every u. for mirrored tables it rotates onto the frame with x flipped
+    def lookup_quat(self, u_array):
+        u = np.clip(np.asarray(u_array, dtype=float), self.u[0], self.u[-1])
+        i = np.clip(np.floor(u * self.samples_per_segment).astype(int), 0, len(self.u) - 2)
+        alpha = (u - self.u[i]) * self.samples_per_segment
+        return slerp(self.quats[i], self.quats[i+1], alpha)
+
+    def lookup(self, u_array):
+        frames = quat_to_frame(self.lookup_quat(u_array))
+        if self.mirror:
+            frames[..., 0, :] *= -1
+        return frames
@@ -1,10 +1,75 @@
 # This code is originated from pyglet basic shapes and I added more functionalities such as deform and move
 
 import pyglet
+import warnings
+import weakref
+import numpy as np
 from pyglet import model
-from math import pi, sin, cos
+from math import pi
 from pyglet.math import Mat4
 
+# mesh_vertexlist and InstancedModel write the buffers of pyglet's vertex domains directly, and
+# InstancedModel sets the instance count of its domain, which pyglet has no public setter for.
+# both follow the internals of the pyglet pinned in environment.yml
+PYGLET_VERSION = "2.1.5"
+if pyglet.version != PYGLET_VERSION:
+    warnings.warn(f"pyglet {pyglet.version} is not the tested {PYGLET_VERSION}, instanced and batched meshes may break")
+
+
+# 24 vertices (4 per face, so every face has its own normal) of a box centered at the origin
+def box_mesh(width, height, depth):
+    w = width / 2
+    h = height / 2
+    d = depth / 2
+
+    vertices = [
+        -w, -h, -d,   # front, bottom-left    0
+        w, -h, -d,    # front, bottom-right   1
+        w, h, -d,     # front, top-right      2         Front
+        -w, h, -d,    # front, top-left       3
+
+        w, -h, d,     # back, bottom-right    4
+        -w, -h, d,    # back, bottom-left     5
+        -w, h, d,     # back, top-left        6         Back
+        w, h, d,      # back, top-right       7
+
+        w, -h, -d,    # front, bottom-right   8
+        w, -h, d,     # back, bottom-right    9
+        w, h, d,      # back, top-right      10         Right
+        w, h, -d,     # front, top-right     11
+
+        -w, -h, d,    # back, bottom-left    12
+        -w, -h, -d,   # front, bottom-left   13
+        -w, h, -d,    # front, top-left      14         Left
+        -w, h, d,     # back, top-left       15
+
+        -w, h, -d,    # front, top-left      16
+        w, h, -d,     # front, top-right     17
+        w, h, d,      # back, top-right      18         Top
+        -w, h, d,     # back, top-left       19
+
+        -w, -h, d,    # back, bottom-left    20
+        w, -h, d,     # back, bottom-right   21
+        w, -h, -d,    # front, bottom-right  22         Bottom
+        -w, -h, -d,   # front, bottom-left   23
+    ]
+
+    normals = [0, 0, -1, 0, 0, -1, 0, 0, -1, 0, 0, -1,     # front face
+               0, 0, 1, 0, 0, 1, 0, 0, 1, 0, 0, 1,         # back face
+               1, 0, 0, 1, 0, 0, 1, 0, 0, 1, 0, 0,         # right face
+               -1, 0, 0, -1, 0, 0, -1, 0, 0, -1, 0, 0,     # left face
+               0, 1, 0, 0, 1, 0, 0, 1, 0, 0, 1, 0,         # top face
+               0, -1, 0, 0, -1, 0, 0, -1, 0, 0, -1, 0]     # bottom face
+
+    indices = [23, 22, 20, 22, 21, 20,  # bottom
+               19, 18, 16, 18, 17, 16,  # top
+               15, 14, 12, 14, 13, 12,  # left
+               11, 10, 8, 10, 9, 8,     # right
+               7, 6, 4, 6, 5, 4,        # back
+               3, 2, 0, 2, 1, 0]        # front
+
+    return vertices, normals, indices
+
 
 class Cube(model.Model):
     def __init__(self, width=1.0, height=1.0, depth=1.0, color=(1.0, 1.0, 1.0, 1.0),
@@ -28,55 +93,7 @@ class Cube(model.Model):
         super().__init__([self._vlist], [self._group], self._batch)
 
     def _create_vertexlist(self):
-        w = self._width / 2
-        h = self._height / 2
-        d = self._depth / 2
-
-        vertices = [
-            -w, -h, -d,   # front, bottom-left    0
-            w, -h, -d,    # front, bottom-right   1
-            w, h, -d,     # front, top-right      2         Front
-            -w, h, -d,    # front, top-left       3
-
-            w, -h, d,     # back, bottom-right    4
-            -w, -h, d,    # back, bottom-left     5
-            -w, h, d,     # back, top-left        6         Back
-            w, h, d,      # back, top-right       7
-
-            w, -h, -d,    # front, bottom-right   8
-            w, -h, d,     # back, bottom-right    9
-            w, h, d,      # back, top-right      10         Right
-            w, h, -d,     # front, top-right     11
-
-            -w, -h, d,    # back, bottom-left    12
-            -w, -h, -d,   # front, bottom-left   13
-            -w, h, -d,    # front, top-left      14         Left
-            -w, h, d,     # back, top-left       15
-
-            -w, h, -d,    # front, top-left      16
-            w, h, -d,     # front, top-right     17
-            w, h, d,      # back, top-right      18         Top
-            -w, h, d,     # back, top-left       19
-
-            -w, -h, d,    # back, bottom-left    20
-            w, -h, d,     # back, bottom-right   21
-            w, -h, -d,    # front, bottom-right  22         Bottom
-            -w, -h, -d,   # front, bottom-left   23
-        ]
-
-        normals = [0, 0, -1, 0, 0, -1, 0, 0, -1, 0, 0, -1,     # front face
-                   0, 0, 1, 0, 0, 1, 0, 0, 1, 0, 0, 1,         # back face
-                   1, 0, 0, 1, 0, 0, 1, 0, 0, 1, 0, 0,         # right face
-                   -1, 0, 0, -1, 0, 0, -1, 0, 0, -1, 0, 0,     # left face
-                   0, 1, 0, 0, 1, 0, 0, 1, 0, 0, 1, 0,         # top face
-                   0, -1, 0, 0, -1, 0, 0, -1, 0, 0, -1, 0]     # bottom face
-
-        indices = [23, 22, 20, 22, 21, 20,  # bottom
-                   19, 18, 16, 18, 17, 16,  # top
-                   15, 14, 12, 14, 13, 12,  # left
-                   11, 10, 8, 10, 9, 8,     # right
-                   7, 6, 4, 6, 5, 4,        # back
-                   3, 2, 0, 2, 1, 0]        # front
+        vertices, normals, indices = box_mesh(self._width, self._height, self._depth)
 
         return self._program.vertex_list_indexed(len(vertices) // 3, pyglet.gl.GL_TRIANGLES, indices,
                                                  batch=self._batch, group=self._group,
@@ -97,6 +114,77 @@ class Cube(model.Model):
             self._vlist = None
 
 
+# unit meshes by (type, resolution). they are built once, instances only scale them
+_mesh_templates = {}
+
+
+def _template(kind, build, *resolution):
+    key = (kind,) + resolution
+    if key not in _mesh_templates:
+        _mesh_templates[key] = build(*resolution)
+    return _mesh_templates[key]
+
+
+# sphere of radius 1, stacks from the +z pole down to the -z pole. normals equal the vertices
+def unit_sphere_mesh(stacks, sectors):
+    stack_angle = pi / 2 - np.arange(stacks + 1) * (pi / stacks)
+    sector_angle = np.arange(sectors + 1) * (2 * pi / sectors)
+    ring = np.cos(stack_angle)[:, np.newaxis]
+    z = np.sin(stack_angle)[:, np.newaxis]
+    vertices = np.stack(np.broadcast_arrays(ring * np.cos(sector_angle), ring * np.sin(sector_angle), z), axis=-1)
+    vertices = vertices.reshape(-1, 3)
+
+    first = np.arange(stacks)[:, np.newaxis] * (sectors + 1) + np.arange(sectors)
+    second = first + sectors + 1
+    indices = np.stack([first, second, second + 1, first, second + 1, first + 1], axis=-1)
+    return vertices, vertices, indices.ravel()
+
+
+# cylinder of radius 1 from z=-1 to z=1: both cap rings (flat normals), then both side rings
+def unit_cylinder_mesh(sectors):
+    sector_angle = np.arange(sectors + 1) * (2 * pi / sectors)
+    circle = np.stack([np.cos(sector_angle), np.sin(sector_angle)], axis=-1)
+    vertices = np.zeros((4, sectors + 1, 3))
+    vertices[:, :, :2] = circle
+    vertices[:, :, 2] = np.array([-1, 1, -1, 1])[:, np.newaxis]
+    normals = np.zeros((4, sectors + 1, 3))
+    normals[0, :, 2] = -1
+    normals[1, :, 2] = 1
+    normals[2:, :, :2] = circle
+
+    j = np.arange(sectors)
+    caps = np.stack([j, j + 1, np.full(sectors, sectors),                                      # bottom
+                     j + sectors + 1, j + sectors + 2, np.full(sectors, 2 * sectors + 1)], axis=-1)  # top
+    first = 2 * (sectors + 1) + j
+    second = first + sectors + 1
+    sides = np.stack([first, second, first + 1, second, second + 1, first + 1], axis=-1)
+    return vertices.reshape(-1, 3), normals.reshape(-1, 3), np.concatenate([caps.ravel(), sides.ravel()])
+
+
+# program.vertex_list_indexed, with indices and attributes written from numpy straight into the batch
+# buffers instead of element by element. color is one rgba for every vertex
+def mesh_vertexlist(program, vertices, normals, indices, color, batch=None, group=None):
+    count = len(vertices)
+    indices = np.asarray(indices)
+    batch = batch or pyglet.graphics.get_default_batch()
+    group = group or pyglet.graphics.ShaderGroup(program=program)
+    attributes = {name: {**program.attributes[name], 'format': 'f', 'instance': False}
+                  for name in ("POSITION", "NORMAL", "COLOR_0")}
+    domain = batch.get_domain(True, False, pyglet.gl.GL_TRIANGLES, group, attributes)
+    vlist = domain.create(count, len(indices))
+
+    index_view = np.frombuffer(domain.index_buffer.data, dtype=np.uint32)
+    index_view[vlist.index_start:vlist.index_start + len(indices)] = indices + vlist.start
+    domain.index_buffer.invalidate_region(vlist.index_start, len(indices))
+    for name, values in (("POSITION", vertices), ("NORMAL", normals), ("COLOR_0", color)):
+        buffer = vlist.domain.attrib_name_buffers[name]
+        start = vlist.start * buffer.count
+        view = np.frombuffer(buffer.data, dtype=np.float32)[start:start + count * buffer.count]
+        view.reshape(count, buffer.count)[:] = values
+        buffer.invalidate_region(vlist.start, count)
+    return vlist
+
+
 class Sphere(model.Model):
 
     def __init__(self, radius=1.0, stacks=30, sectors=30, color=(1.0, 1.0, 1.0, 1.0),
@@ -120,41 +208,10 @@ class Sphere(model.Model):
         super().__init__([self._vlist], [self._group], self._batch)
 
     def _create_vertexlist(self):
-        radius = self._radius / 2
-        sectors = self._sectors
-        stacks = self._stacks
-
-        vertices = []
-        normals = []
-        indices = []
-
-        sector_step = 2 * pi / sectors
-        stack_step = pi / stacks
-
-        for i in range(stacks + 1):
-            stack_angle = pi / 2 - i * stack_step
-            for j in range(sectors + 1):
-                sector_angle = j * sector_step
-                vertices.append(radius * cos(stack_angle) * cos(sector_angle))    # x
-                vertices.append(radius * cos(stack_angle) * sin(sector_angle))    # y
-                vertices.append(radius * sin(stack_angle))                             # z
-                normals.append(cos(stack_angle) * cos(sector_angle))              # x
-                normals.append(cos(stack_angle) * sin(sector_angle))              # y
-                normals.append(sin(stack_angle))                                       # z
-
-        # Generate indices
-        for i in range(stacks):
-            for j in range(sectors):
-                first = i * (sectors + 1) + j
-                second = first + sectors + 1
-                indices.extend([first, second, second + 1])
-                indices.extend([first, second + 1, first + 1])
+        vertices, normals, indices = _template("sphere", unit_sphere_mesh, self._stacks, self._sectors)
+        return mesh_vertexlist(self._program, vertices * (self._radius / 2), normals, indices, self._color,
+                               batch=self._batch, group=self._group)
 
-        return self._program.vertex_list_indexed(len(vertices) // 3, pyglet.gl.GL_TRIANGLES, indices,
-                                                 batch=self._batch, group=self._group,
-                                                 POSITION=('f', vertices),
-                                                 NORMAL=('f', normals),
-                                                 COLOR_0=('f', self._color * (len(vertices) // 3)))
     def deform(self, deformMat):
         self.deformation = self.deformation @ deformMat
         self.matrix = self.movement @ self.deformation
@@ -192,54 +249,10 @@ class Cylinder(model.Model):
         super().__init__([self._vlist], [self._group], self._batch)
 
     def _create_vertexlist(self):
-        radius = self._radius / 2
-        height = self._height / 2
-        sectors = self._sectors
-
-        vertices = []
-        normals = []
-        indices = []
-
-        sector_step = 2 * pi / sectors
-        
-        # Top and bottom circle vertices
-        for i in range(2):  # i=0 for bottom, i=1 for top
-            z = -height if i == 0 else height
-            normal_z = -1 if i == 0 else 1
-            for j in range(sectors + 1):
-                sector_angle = j * sector_step
-                x = radius * cos(sector_angle)
-                y = radius * sin(sector_angle)
-                vertices.extend([x, y, z])
-                normals.extend([0, 0, normal_z])
-        
-        # Side vertices
-        for i in range(2):  # i=0 for bottom, i=1 for top
-            z = -height if i == 0 else height
-            for j in range(sectors + 1):
-                sector_angle = j * sector_step
-                x = radius * cos(sector_angle)
-                y = radius * sin(sector_angle)
-                vertices.extend([x, y, z])
-                normals.extend([cos(sector_angle), sin(sector_angle), 0])
-        
-        # Indices for top and bottom circles
-        for j in range(sectors):
-            indices.extend([j, j + 1, sectors])  # Bottom circle
-            indices.extend([j + sectors + 1, j + sectors + 2, 2 * sectors + 1])  # Top circle
-        
-        # Indices for side faces
-        for j in range(sectors):
-            first = 2 * (sectors + 1) + j
-            second = first + sectors + 1
-            indices.extend([first, second, first + 1])
-            indices.extend([second, second + 1, first + 1])
-
-        return self._program.vertex_list_indexed(len(vertices) // 3, pyglet.gl.GL_TRIANGLES, indices,
-                                                 batch=self._batch, group=self._group,
-                                                 POSITION=('f', vertices),
-                                                 NORMAL=('f', normals),
-                                                 COLOR_0=('f', self._color * (len(vertices) // 3)))
+        vertices, normals, indices = _template("cylinder", unit_cylinder_mesh, self._sectors)
+        scale = np.array([self._radius / 2, self._radius / 2, self._height / 2])
+        return mesh_vertexlist(self._program, vertices * scale, normals, indices, self._color,
+                               batch=self._batch, group=self._group)
     
     def deform(self, deformMat):
         self.deformation = self.deformation @ deformMat
@@ -341,4 +354,253 @@ class Tripillar(model.Model):
     def delete(self):
         if self._vlist is not None:
             self._vlist.delete()
-            self._vlist = None
\ No newline at end of file
+            self._vlist = None
+
+
+# circular cross sections swept along a path, as one indexed triangle mesh.
+# centers: (M x 3) ring centers, frames: (M x 3 x 3) stacked (x, y, z) with z along the path.
+# rings are joined in order, and the last one to the first when closed, so consecutive pieces
+# share their vertices: no gaps and no overlaps. an open tube may have end_sectors sides at its first
+# and last ring, so that tubes of different sectors meet on the same ring.
+# returns vertices, normals (one row per ring vertex) and indices
+def tube_mesh(centers, frames, radius, sectors=12, closed=False, end_sectors=None):
+    sides = ring_sides(len(centers), sectors, closed, end_sectors)
+    vertices, normals = tube_rings(centers, frames, radius, sides)
+    return vertices, normals, tube_indices(sides, closed)
+
+
+# sides of every ring of a tube of M rings
+def ring_sides(M, sectors=12, closed=False, end_sectors=None):
+    sides = np.full(M, sectors)
+    if end_sectors is not None and not closed:
+        sides[[0, -1]] = end_sectors
+    return sides
+
+
+# the vertices and normals of rings with sides[i] sides, ring after ring
+def tube_rings(centers, frames, radius, sides):
+    centers = np.asarray(centers, dtype=float)
+    frames = np.asarray(frames, dtype=float)
+    ring = np.repeat(np.arange(len(sides)), sides)
+    starts = np.cumsum(sides) - sides
+    angle = (np.arange(len(ring)) - starts[ring]) * (2 * pi) / sides[ring]
+    # unit directions around every ring: cos x + sin y
+    normals = np.cos(angle)[:, np.newaxis] * frames[ring, 0] + np.sin(angle)[:, np.newaxis] * frames[ring, 1]
+    vertices = centers[ring] + radius * normals
+    return vertices, normals
+
+
+def tube_indices(sides, closed=False):
+    M = len(sides)
+    starts = np.cumsum(sides) - sides
+    rings = np.arange(M if closed else M - 1)
+    after = (rings + 1) % M
+    same = rings[sides[rings] == sides[after]]
+    # rings with the same sides are joined by quads
+    ring = np.repeat(same, sides[same])
+    j = np.arange(len(ring)) - np.repeat(np.cumsum(sides[same]) - sides[same], sides[same])
+    s = sides[ring]
+    a = starts[ring] + j                    # ring i, sector j
+    b = starts[ring] + (j + 1) % s          # ring i, sector j+1
+    c = starts[after[ring]] + j             # ring i+1, sector j
+    d = starts[after[ring]] + (j + 1) % s   # ring i+1, sector j+1
+    indices = [np.stack([a, c, b, b, c, d], axis=-1).ravel()]
+    # others by a fan of triangles, stepping around whichever ring has the nearer next vertex
+    for i in rings[sides[rings] != sides[after]]:
+        na, nb = sides[i], sides[after[i]]
+        j = k = 0
+        while j < na or k < nb:
+            A, B = starts[i] + j % na, starts[after[i]] + k % nb
+            if k == nb or (j < na and (j + 1) * nb <= (k + 1) * na):
+                j += 1
+                indices.append([A, B, starts[i] + j % na])
+            else:
+                k += 1
+                indices.append([A, B, starts[after[i]] + k % nb])
+    return np.concatenate(indices)
+
+
+class Tube(model.Model):
+
+    def __init__(self, centers, frames, radius=1.0, sectors=12, closed=False, color=(1.0, 1.0, 1.0, 1.0),
+                 material=None, batch=None, group=None, program=None, end_sectors=None):
+        self._radius = radius
+        self._sectors = sectors
+        self._closed = closed
+        self._sides = ring_sides(len(centers), sectors, closed, end_sectors)
+        self._color = color
+        self.deformation = Mat4()
+        self.movement = Mat4()
+
+        self._batch = batch
+        self._program = program if program else model.get_default_shader()
+
+        # Create a Material and Group for the Model
+        self._material = material if material else model.SimpleMaterial(name="tube")
+        self._group = pyglet.model.MaterialGroup(material=self._material, program=self._program, parent=group)
+
+        self._vlist = self._create_vertexlist(centers, frames)
+
+        super().__init__([self._vlist], [self._group], self._batch)
+
+    def _create_vertexlist(self, centers, frames):
+        vertices, normals = tube_rings(centers, frames, self._radius, self._sides)
+        indices = tube_indices(self._sides, self._closed)
+        return mesh_vertexlist(self._program, vertices, normals, indices, self._color,
+                               batch=self._batch, group=self._group)
+
+    # move rings first .. first+len(centers)-1 to a new path, in place
+    def update_rings(self, first, centers, frames):
+        vertices, normals = tube_rings(centers, frames, self._radius, self._sides[first:first + len(centers)])
+        start = self._sides[:first].sum() * 3
+        self._vlist.POSITION[start:start + vertices.size] = vertices.astype(np.float32).ravel()
+        self._vlist.NORMAL[start:start + normals.size] = normals.astype(np.float32).ravel()
+
+    # hidden tubes stay in the batch with their vertices, but are not drawn
+    @property
+    def visible(self):
+        return self._group.visible
+
+    @visible.setter
+    def visible(self, value):
+        if value != self._group.visible:
+            self._group.visible = value
+
+    def deform(self, deformMat):
+        self.deformation = self.deformation @ deformMat
+        self.matrix = self.movement @ self.deformation
+
+    def move(self, moveMat):
+        self.movement = moveMat @ self.movement
+        self.matrix = self.movement @ self.deformation
+    
+    def delete(self):
+        if self._vlist is not None:
+            self._vlist.delete()
+            self._vlist = None
+
+
+
+# pyglet's default model shader, with the model matrix of every instance read from four
+# per-instance column attributes (pyglet cannot introspect mat4 attributes)
+INSTANCE_ATTRIBUTES = ("INSTANCE_0", "INSTANCE_1", "INSTANCE_2", "INSTANCE_3")
+
+instanced_vert_src = """#version 330 core
+    in vec3 POSITION;
+    in vec3 NORMAL;
+    in vec4 COLOR_0;
+    in vec4 INSTANCE_0;
+    in vec4 INSTANCE_1;
+    in vec4 INSTANCE_2;
+    in vec4 INSTANCE_3;
+
+    out vec4 color_0;
+    out vec3 normal;
+    out vec3 position;
+
+    uniform WindowBlock
+    {
+        mat4 projection;
+        mat4 view;
+    } window;
+
+    uniform mat4 model;
+
+    void main()
+    {
+        mat4 mv = window.view * model * mat4(INSTANCE_0, INSTANCE_1, INSTANCE_2, INSTANCE_3);
+        vec4 pos = mv * vec4(POSITION, 1.0);
+        gl_Position = window.projection * pos;
+        mat3 normal_matrix = transpose(inverse(mat3(mv)));
+
+        position = pos.xyz;
+        color_0 = COLOR_0;
+        normal = normal_matrix * NORMAL;
+    }
+"""
+
+
+_instanced_programs = weakref.WeakKeyDictionary()
+
+
+# one program per gl context, shared by every InstancedModel drawn in it
+def get_instanced_shader():
+    context = pyglet.gl.current_context
+    program = _instanced_programs.get(context)
+    if program is None:
+        program = context.create_program((instanced_vert_src, 'vertex'),
+                                         (model.MaterialGroup.default_frag_src, 'fragment'))
+        _instanced_programs[context] = program
+    return program
+
+
+# one mesh drawn at many transforms with a single instanced draw call.
+# transforms: (K x 4 x 4) model matrices, applied after the Model's own matrix
+class InstancedModel(model.Model):
+
+    def __init__(self, vertices, normals, indices, transforms=None, color=(1.0, 1.0, 1.0, 1.0),
+                 material=None, batch=None, group=None, program=None):
+        self._color = color
+        self.deformation = Mat4()
+        self.movement = Mat4()
+
+        self._batch = batch
+        self._program = program if program else get_instanced_shader()
+
+        # Create a Material and Group for the Model
+        self._material = material if material else model.SimpleMaterial(name="instanced")
+        self._group = pyglet.model.MaterialGroup(material=self._material, program=self._program, parent=group)
+
+        self._vlist = self._create_vertexlist(vertices, normals, indices)
+        # the instanced domain never uploads its index buffer when drawing; the indices are fixed, upload them once
+        self._vlist.domain.index_buffer.commit()
+        self.set_transforms(np.eye(4)[np.newaxis] if transforms is None else transforms)
+
+        super().__init__([self._vlist], [self._group], self._batch)
+
+    def _create_vertexlist(self, vertices, normals, indices):
+        count = len(vertices) // 3
+        return self._program.vertex_list_instanced_indexed(count, pyglet.gl.GL_TRIANGLES, indices, INSTANCE_ATTRIBUTES,
+                                                           batch=self._batch, group=self._group,
+                                                           POSITION=('f', vertices),
+                                                           NORMAL=('f', normals),
+                                                           COLOR_0=('f', self._color * count),
+                                                           **{name: 'f' for name in INSTANCE_ATTRIBUTES})
+
+    # replace every instance transform at once, straight into the attribute buffers
+    def set_transforms(self, transforms):
+        transforms = np.asarray(transforms, dtype=np.float32).reshape(-1, 4, 4)
+        K = len(transforms)
+        domain = self._vlist.domain
+        for column, name in enumerate(INSTANCE_ATTRIBUTES):
+            buffer = domain.attrib_name_buffers[name]
+            if buffer.size < K * buffer.stride:
+                buffer.resize(1 << (K * buffer.stride - 1).bit_length())
+            np.frombuffer(buffer.data, dtype=np.float32)[:4*K] = transforms[:, :, column].ravel()
+            buffer.invalidate_region(0, K)
+        # each instanced vertex list has a domain of its own, which draws this many instances.
+        # private in pyglet (see PYGLET_VERSION): add_instance would set the rows one by one
+        domain._instances = K
+        self.count = K
+
+    @property
+    def visible(self):
+        return self._group.visible
+
+    @visible.setter
+    def visible(self, value):
+        if value != self._group.visible:
+            self._group.visible = value
+
+    def deform(self, deformMat):
+        self.deformation = self.deformation @ deformMat
+        self.matrix = self.movement @ self.deformation
+
+    def move(self, moveMat):
+        self.movement = moveMat @ self.movement
+        self.matrix = self.movement @ self.deformation
+    
+    def delete(self):
+        if self._vlist is not None:
+            self._vlist.delete()
+            self._vlist = None
@@ -0,0 +1,155 @@
+# Track files: passing points as text (csv or whitespace separated, one point per row),
+# .npy, or raw binary floats (.bin/.f64 are float64, .f32 is float32, x y z of every point in turn).
+# Text is parsed in chunks straight into numpy, binary is memory mapped, so loading needs memory
+# for the points only.
+import os
+import warnings
+import numpy as np
+
+RAW_DTYPES = {".bin": "<f8", ".f64": "<f8", ".f32": "<f4"}
+
+# bytes between the values of a text file, as a lookup table
+SEPARATORS = np.zeros(256, dtype=bool)
+SEPARATORS[list(b" \t\r\n,")] = True
+# bytes.translate table turning every separator into a space, so a block is one whitespace list
+TO_SPACES = bytes(ord(" ") if separator else byte for byte, separator in enumerate(SEPARATORS))
+
+# help of the --track option of main.py and the command line tools
+TRACK_HELP = "passing points (.csv, .txt, .npy, or raw .bin/.f64/.f32 floats). default: the built-in track"
+
+# the track ridden when no track file is given
+DEFAULT_TRACK = np.array([
+    [0, 0, 0],
+    [-1, -2, 0],
+    [1, -2, -1],
+    [2, 2, 0],
+    [1, 3, 5],
+    [1, 2, 5],
+    [4, 1, 5],
+    [4.5, 1.5, 3],
+    [5, 4, 1],
+    [4.5, 6, 2],
+    [4, 4, 4],
+    [3.5, 4, 1],
+    [3, 6, 0],
+    [1, 5, -1],
+    [0, 0, 0]
+])
+
+
+# same test as NatCubeSpline.closed
+def is_closed(points):
+    return np.array_equal(points[0], points[-1])
+
+
+# passing points of a track file as a contiguous (N x dim) float64 array.
+# end points closer than close_tol are made equal, so the spline treats the track as closed
+def load_track(path, dim=3, close_tol=0.0, chunk_size=1 << 24):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".npy":
+        points = np.load(path, mmap_mode="r")
+    elif ext in RAW_DTYPES:
+        points = np.memmap(path, dtype=RAW_DTYPES[ext], mode="r")
+        if points.size % dim != 0:
+            raise ValueError(f"{path}: {points.size} values is not a whole number of {dim}d points")
+        points = points.reshape(-1, dim)
+    else:
+        points = _read_text(path, dim, chunk_size)
+
+    points = np.ascontiguousarray(points, dtype=np.float64)
+    if points.ndim != 2 or points.shape[1] != dim:
+        raise ValueError(f"{path}: expected points of {dim} coordinates, got shape {points.shape}")
+
+    if len(points) < 2:
+        validate_points(points, path)
+    if not is_closed(points) and close_tol > 0 and np.linalg.norm(points[-1] - points[0]) <= close_tol:
+        points = points.copy()  # binary tracks are read-only memory maps
+        points[-1] = points[0]
+    # after snapping, which can leave the last two points the same
+    validate_points(points, path)
+    return points
+
+
+def validate_points(points, name="track"):
+    if len(points) == 0:
+        raise ValueError(f"{name}: no points")
+    if len(points) < 2:
+        raise ValueError(f"{name}: a track needs at least 2 points, got {len(points)}")
+    if not np.all(np.isfinite(points)):
+        bad = np.nonzero(~np.all(np.isfinite(points), axis=1))[0]
+        raise ValueError(f"{name}: point {bad[0]} is not finite")
+    repeated = np.nonzero(np.all(points[1:] == points[:-1], axis=1))[0]
+    if len(repeated) > 0:
+        raise ValueError(f"{name}: points {repeated[0]} and {repeated[0]+1} are the same, segments need length")
+
+
+# text rows of dim numbers separated by commas and/or whitespace. a first row that is not numeric
+# is a header. blank lines are skipped
+def _read_text(path, dim, chunk_size):
+    chunks = []
+    with open(path, "rb") as f:
+        first = f.readline()
+        try:
+            row = np.array(first.translate(TO_SPACES).split(), dtype=float)
+        except ValueError:
+            row = None  # header
+        if row is not None and len(row) > 0:
+            if len(row) != dim:
+                raise ValueError(f"{path}: line 1 has {len(row)} values, expected {dim}")
+            chunks.append(row)
+
+        rest = b""
+        line = 2  # number of the first line of the next block
+        while True:
+            block = f.read(chunk_size)
+            if not block:
+                break
+            # parse complete lines only, carry the last partial line over
+            block = rest + block
+            end = block.rfind(b"\n") + 1
+            block, rest = block[:end], block[end:]
+            chunks.append(_parse(block, path, dim, line))
+            line += block.count(b"\n")
+        chunks.append(_parse(rest, path, dim, line))
+
+    values = np.concatenate(chunks) if chunks else np.empty(0)
+    if values.size % dim != 0:
+        raise ValueError(f"{path}: {values.size} values is not a whole number of {dim}d points")
+    return values.reshape(-1, dim)
+
+
+# number of values on every line of a block
+def _row_lengths(block):
+    data = np.frombuffer(block, dtype=np.uint8)
+    value = ~SEPARATORS[data]
+    starts = np.flatnonzero(value & ~np.concatenate([[False], value[:-1]]))
+    # values that start before each line break
+    before = np.searchsorted(starts, np.flatnonzero(data == ord("\n")))
+    return np.diff(np.concatenate([[0], before, [len(starts)]]))
+
+
+# the values of a block of whole lines, checked to be dim numbers on every line that is not blank
+def _parse(block, path, dim, first_line):
+    lengths = _row_lengths(block)
+    bad = np.nonzero((lengths != 0) & (lengths != dim))[0]
+    if len(bad) > 0:
+        raise ValueError(f"{path}: line {first_line + bad[0]} has {lengths[bad[0]]} values, expected {dim}")
+    # commas and line breaks become spaces: the rows are counted already, so empty fields and blank
+    # lines need no care
+    values = block.translate(TO_SPACES)
+    if not values.strip():
+        return np.empty(0)
+    # fromstring only warns when it stops at something that is not a number
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", DeprecationWarning)
+        try:
+            return np.fromstring(values, dtype=float, sep=" ")
+        except (DeprecationWarning, ValueError):
+            pass
+    # line by line, only to name the line in the error
+    for number, line in enumerate(block.split(b"\n"), first_line):
+        try:
+            np.array(line.translate(TO_SPACES).split(), dtype=float)
+        except ValueError:
+            raise ValueError(f"{path}: line {number} has values that are not numbers") from None
+    raise ValueError(f"{path}: has values that are not numbers")
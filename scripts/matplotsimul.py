@@ -1,4 +1,4 @@
-from scripts.spline import NatCubeSpline
+from scripts.spline import NatCubeSpline, SplineCursor
 import numpy as np
 from scripts import utils
 import matplotlib.pyplot as plt
@@ -28,7 +28,7 @@ ax.plot(*test_points.T, 'o--', label='Given Points')
 
 # Plot spline using global parameter u
 u_vals = np.linspace(test.umin, test.umax, 300)
-spline_coords = np.array([test.coordinate(u) for u in u_vals])
+spline_coords = test.coordinates(u_vals)
 ax.plot(spline_coords[:, 0], spline_coords[:, 1], spline_coords[:, 2], 'r', label='Spline Curve')
 
 # Setup axis
@@ -41,8 +41,8 @@ ax.legend()
 # Initialize parameters
 tmax = 100
 smax = test.length(test.umax)
+cursor = SplineCursor(test)
 u = 0
-s = 0
 t = 0
 dt = 0.01
 
@@ -51,11 +51,11 @@ frame_quivers = []
 
 while t<tmax:
     # Update s, t, u
-    if s >= smax:
-        s = 0
-    s += test.speed(u) * dt
+    if cursor.s >= smax:
+        cursor.reset()
+    cursor.advance(test.speed(u) * dt)
     t += dt
-    u = test.inv_length(s)
+    u = cursor.u
 
     # Clear previous quivers
     for quiver in frame_quivers:
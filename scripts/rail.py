@@ -1,93 +1,501 @@
+import threading
+import time
+import numpy as np
 from scripts import geometry
-from pyglet.math import Mat4, Vec3
-from scripts.utils import centerNvector
+from scripts.utils import normalize_many, frame_matrices, frustum_planes, boxes_in_frustum
+from scripts.frames import FRAME_TYPES, TABLE_SAMPLES_PER_SEGMENT
+
+# tube resolutions of a rail chunk from near to far: (ring stride, sectors)
+LOD_LEVELS = ((1, 12), (2, 8), (5, 4))
+
+
+def _exhaust(steps):
+    for _ in steps:
+        pass
+
+
+# largest distance of the rails at offset from the straight pieces between us, per piece,
+# in one frame type. measured at every eighth of each piece
+def chord_errors(spline, us, offset, frame):
+    t = np.arange(1, 8)/8
+    u = np.concatenate([us, (us[:-1, np.newaxis] + np.diff(us)[:, np.newaxis]*t).ravel()])
+    centers = spline.coordinates(u)
+    x = spline.frame_table(frame).lookup(u)[:, 0]
+    errors = np.zeros(len(us) - 1)
+    for path in (centers + offset*x, centers - offset*x):
+        a, b = path[:len(us)-1], path[1:len(us)]
+        p = path[len(us):].reshape(len(us) - 1, len(t), 3) - a[:, np.newaxis]
+        ab = (b - a)[:, np.newaxis]
+        w = np.sum(p*ab, axis=-1)/np.maximum(np.sum(ab*ab, axis=-1), 1e-18)
+        miss = np.linalg.norm(p - np.clip(w, 0, 1)[..., np.newaxis]*ab, axis=-1)
+        errors = np.maximum(errors, miss.max(axis=-1))
+    return errors
+
+
+# curvature (per arc length) of every row of paths at the samples, by second differences. 0 at the ends
+def _bending(paths, ds):
+    d = np.diff(paths, axis=-2)/ds[:, np.newaxis]
+    k = np.zeros(paths.shape[:-1])
+    k[..., 1:-1] = np.linalg.norm(np.diff(d, axis=-2), axis=-1)/((ds[1:] + ds[:-1])/2)
+    return k
+
+
+# ring positions (u) from u0 to u1 (default: the whole track) of the rails at offset from the spline,
+# spaced so that the straight pieces between rings are at most tolerance away from the curved rails.
+# a piece ds long misses a curve of curvature k by about k ds^2/8. the spacing comes from a pilot
+# sampling and holds for every frame type without building their tables: the frenet and up frames
+# are evaluated directly at the table nodes, and a rotation minimizing frame turns at w = T x T', so
+# its rails bend by at most kappa + offset*(|w'| + kappa^2). refine_us checks it in one frame type
+def adaptive_us(spline, tolerance, offset, max_step, u0=None, u1=None, pilot=64):
+    u0 = spline.umin if u0 is None else u0
+    u1 = spline.umax if u1 is None else u1
+    u = np.linspace(u0, u1, max(int(np.ceil((u1 - u0)*pilot)), 2) + 1)
+    s = spline.length_many(u)
+    ds = np.maximum(np.diff(s), 1e-12)
+    centers = spline.coordinates(u)
+
+    kappa = _bending(centers, ds)
+    tangents = normalize_many(spline.tangents(u))
+    turn = np.cross(tangents[:-1], np.diff(tangents, axis=0)/ds[:, np.newaxis])  # w between samples
+    turn_rate = np.zeros(len(u))
+    turn_rate[1:-1] = np.linalg.norm(np.diff(turn, axis=0), axis=-1)/((ds[1:] + ds[:-1])/2)
+    bend = kappa + offset*(turn_rate + kappa**2)
+    # the frenet and up rails follow their tables, which interpolate between frames at the nodes
+    per = TABLE_SAMPLES_PER_SEGMENT
+    nodes = spline.umin + np.arange(np.floor((u0 - spline.umin)*per), np.ceil((u1 - spline.umin)*per) + 1)/per
+    for direct in ("frenet_frame", "up_frame"):
+        x = spline.frames(nodes, direct)[:, 0]
+        x = normalize_many(np.stack([np.interp(u, nodes, x[:, k]) for k in range(3)], axis=-1))
+        bend = np.maximum(bend, _bending(np.stack([centers + offset*x, centers - offset*x]), ds).max(axis=0))
+    # a piece is as bent as the most bent of its ends
+    bend = np.maximum(bend[1:], bend[:-1])
+
+    step = np.minimum(np.sqrt(8*tolerance/np.maximum(bend, 1e-12)), max_step)
+    # rings where the running count of steps reaches a whole number, spread evenly
+    count = np.concatenate([[0.0], np.cumsum(ds/step)])
+    n = max(int(np.ceil(count[-1])), 1)
+    us = spline.inv_length_many(np.interp(np.linspace(0, count[-1], n + 1), count, s))
+    us[0], us[-1] = u0, u1  # inv_length_many wraps the end of a closed track to 0
+    return us
+
+
+# us with the pieces that still miss the rails at offset by more than tolerance in frame halved,
+# until they fit or for at most rounds rounds. the frame table of frame is built if it was not yet
+def refine_us(spline, us, tolerance, offset, frame, rounds=4):
+    for _ in range(rounds):
+        split = chord_errors(spline, us, offset, frame) > tolerance
+        if not split.any():
+            break
+        us = np.sort(np.concatenate([us, (us[:-1] + us[1:])[split]/2]))
+    return us
+
+
+# tubes and plates of the rail in one frame type.
+# compute() only evaluates the spline, so it may run in a worker thread; upload() makes the GL objects
+# and has to run on the main thread. both yield after every chunk, so they can be spread over frames
+class RailGeometry:
+    def __init__(self, rail, frame):
+        self.rail = rail
+        self.frame = frame
+        self.us = [None]*len(rail.chunks)     # us[k] = ring u of a chunk in this frame type, both ends included
+        self.paths = [None]*len(rail.chunks)  # paths[k][level] = (left, right) (centers, frames) of a chunk
+        self.plate_matrices = None
+        self.tubes = []                       # tubes[k][level] = (left, right)
+        self.plates = None
+        self.computed = False
+        self.uploaded = False
+        self.cancelled = False                # set when the result is no longer wanted
+
+    def compute(self):
+        rail = self.rail
+        # the frame table of a new frame type is built on first use, the longest single step
+        rail.spline.frame_table(self.frame)
+        yield
+        # the rings of the rail, with the pieces that miss in this frame type halved
+        self.us = rail.split_chunks(refine_us(rail.spline, rail.us, rail.tolerance, rail.reach, self.frame))
+        yield
+        for k in range(len(self.paths)):
+            if self.cancelled:
+                return
+            self.paths[k] = rail.chunk_paths(self.us[k], self.frame)
+            yield
+        self.plate_matrices = rail.plate_matrices(self.frame)
+        self.computed = True
+
+    # new objects start hidden, Rail.swap shows them
+    def upload(self):
+        rail = self.rail
+        for levels in self.paths[len(self.tubes):]:
+            self.tubes.append(self.chunk_tubes(levels))
+            yield
+        # all plates share one box mesh, drawn instanced
+        vertices, normals, indices = geometry.box_mesh(width=0.2, height=0.02, depth=0.1)
+        self.plates = geometry.InstancedModel(vertices, normals, indices, batch=rail.railbatch, color=rail.color2)
+        self.plates.visible = False
+        self.uploaded = True
+
+    # hidden (left, right) tubes of a chunk at every level, along its paths. every level ends on rings with
+    # the finest level's sides, so that neighbouring chunks share their end rings whatever their levels
+    def chunk_tubes(self, levels):
+        rail = self.rail
+        chunk = []
+        for (_, sectors), paths in zip(LOD_LEVELS, levels):
+            pair = tuple(geometry.Tube(centers, frames, radius=rail.thickness/4.0, sectors=sectors,
+                                       end_sectors=LOD_LEVELS[0][1], batch=rail.railbatch, color=rail.color1)
+                         for centers, frames in paths)
+            for tube in pair:
+                tube.visible = False
+            chunk.append(pair)
+        return chunk
+
+    @property
+    def objects(self):
+        tubes = [tube for levels in self.tubes for pair in levels for tube in pair]
+        return tubes if self.plates is None else tubes + [self.plates]
+
+    # a chunk draws the tubes of its level, and nothing when it is out of view
+    def show_chunks(self, chunks, levels, in_view):
+        for k in chunks:
+            for level, pair in enumerate(self.tubes[k]):
+                for tube in pair:
+                    tube.visible = bool(in_view[k]) and level == levels[k]
+
+    def show_plates(self, in_view, plate_chunks):
+        self.plates.visible = True
+        self.plates.set_transforms(self.plate_matrices[in_view[plate_chunks]])
+
+    def hide(self):
+        for obj in self.objects:
+            obj.visible = False
+
+    # refine and recompute the rings of chunks after an edit. chunks that keep their ring count move
+    # the rings in place, the others get new (hidden) tubes
+    def place_chunks(self, chunks):
+        rail = self.rail
+        for k in chunks:
+            first, last = rail.chunks[k]
+            count = len(self.us[k])
+            self.us[k] = refine_us(rail.spline, rail.us[first:last+1], rail.tolerance, rail.reach, self.frame)
+            self.paths[k] = rail.chunk_paths(self.us[k], self.frame)
+            if len(self.us[k]) != count:
+                for pair in self.tubes[k]:
+                    for tube in pair:
+                        tube.delete()
+                self.tubes[k] = self.chunk_tubes(self.paths[k])
+                continue
+            for levels, pair in zip(self.paths[k], self.tubes[k]):
+                for tube, (centers, frames) in zip(pair, levels):
+                    tube.update_rings(0, centers, frames)
+
+    def delete(self):
+        self.cancelled = True
+        for obj in self.objects:
+            obj.delete()
+
 
 class Rail:
-    def __init__(self, spline, thickness, width, n_cylinders, n_plates, batch=None, frame="up_frame"):
+    def __init__(self, spline, thickness, width, tolerance=0.002, plate_spacing=0.9, max_step=0.5, batch=None,
+                 frame="up_frame", chunk_rings=50, lod_distances=(4.0, 12.0), lod_hysteresis=0.15, threaded=True):
         self.spline = spline
         self.thickness = thickness
         self.width = width
-        self.n_cylinders = n_cylinders
-        self.n_plates = n_plates
-        self.du = (spline.N-1)/n_cylinders
+        # rings are placed closer where the track bends or the frame turns, so that the tubes are at
+        # most tolerance away from the true rails (at the finest level), and never more than max_step apart
+        self.tolerance = tolerance
+        self.max_step = max_step
+        self.plate_spacing = plate_spacing
         self.railbatch = batch
         self.frame = frame
+        self.reach = 0.1 + thickness/4.0  # from the track to the outer side of a rail tube
         self.color1 = (1, 0, 0, 0.5)
         self.color2 = (1, 1, 1, 1)
+        # the track is cut into chunks of chunk_rings rings, each drawn at one of LOD_LEVELS.
+        # a chunk is level i when the camera is between lod_distances[i-1] and lod_distances[i] from it,
+        # and keeps its level until the distance is lod_hysteresis (relative) past the boundary
+        self.chunk_rings = chunk_rings
+        self.lod_distances = np.asarray(lod_distances, dtype=float)
+        self.lod_hysteresis = lod_hysteresis
+        # rebuilds run in a worker thread, or else a few steps per poll() on the main thread
+        self.threaded = threaded
         self.create_rail()
 
     def create_rail(self):
-        self.objects = []
-        
-        for i in range(self.n_cylinders):
-            u = i*self.du
-            ds = self.spline.length(u-3*self.du/5)-self.spline.length(u+3*self.du/5)
-
-            if self.frame == "up_frame":
-                x, y, z = self.spline.up_frame(u)
-            if self.frame == "frenet_frame":
-                x, y, z = self.spline.frenet_frame(u)
-
-            left_cylinder = geometry.Cylinder(radius=self.thickness/2.0, height=ds, batch=self.railbatch, color=self.color1)
-            left_cylinder.matrix = Mat4.from_translation(0.1*Vec3(*x)) @ centerNvector(Mat4, self.spline.coordinate(u), z, y)
-
-            right_cylinder = geometry.Cylinder(radius=self.thickness/2.0, height=ds, batch=self.railbatch, color=self.color1)
-            right_cylinder.matrix = Mat4.from_translation(-0.1*Vec3(*x)) @ centerNvector(Mat4, self.spline.coordinate(u), z, y)
-            self.objects.append(left_cylinder)
-            self.objects.append(right_cylinder)
-    
-        length = self.spline.length(self.spline.umax)
-        dlength = length/self.n_plates
-
-        for i in range(self.n_plates):
-            s = dlength*i
-            u = self.spline.inv_length(s)
-
-            if self.frame == "up_frame":
-                x, y, z = self.spline.up_frame(u)
-            if self.frame == "frenet_frame":
-                x, y, z = self.spline.frenet_frame(u)
-            plate = geometry.Cube(width=0.2, height=0.02, depth=0.1, batch=self.railbatch, color=self.color2)
-            plate.matrix = Mat4.from_translation(0.03*Vec3(*y)) @ centerNvector(Mat4, self.spline.coordinate(u), z, y)
-            self.objects.append(plate)
-    
+        # rings for every frame type, which each RailGeometry refines for its own. the chunks are cut
+        # at these rings. a closed track ends on a ring at umax, the same place as the first one
+        self.us = adaptive_us(self.spline, self.tolerance, self.reach, self.max_step)
+        n_rings = len(self.us) - 1
+        starts = np.arange(0, n_rings, self.chunk_rings)
+        self.chunks = np.stack([starts, np.minimum(starts + self.chunk_rings, n_rings)], axis=-1)
+        self.bounds = np.zeros((len(self.chunks), 2, 3))
+        self.update_bounds(range(len(self.chunks)))
+        self.levels = np.zeros(len(self.chunks), dtype=int)
+        self.in_view = np.ones(len(self.chunks), dtype=bool)
+        self.place_plates()
+
+        # one RailGeometry per frame type built so far. the first one is built right away
+        self.geometries = {}
+        self.pending = None
+        self.worker = None
+        self.stopping = []  # workers of cancelled rebuilds that may still run
+        self.steps = None
+        self.uploads = None
+        self.geometry = RailGeometry(self, self.frame)
+        _exhaust(self.geometry.compute())
+        _exhaust(self.geometry.upload())
+        self.swap(self.geometry)
+
+    @property
+    def objects(self):
+        geometries = list(self.geometries.values())
+        if self.pending is not None:
+            geometries.append(self.pending)
+        return [obj for geometry in geometries for obj in geometry.objects]
+
+    # ring indices of a chunk at a ring stride, always ending on the chunk's last ring
+    @staticmethod
+    def chunk_rings_at(first, last, stride):
+        return np.append(np.arange(first, last, stride), last)
+
+    # (centers, frames) of the left and the right rail at every u of us
+    def rail_paths(self, us, frame=None):
+        centers = self.spline.coordinates(us)
+        frames = self.spline.frame_table(frame or self.frame).lookup(us)
+        x = frames[:, 0]
+        return (centers + 0.1*x, frames), (centers - 0.1*x, frames)
+
+    # rail_paths of a chunk with rings at us at every level of LOD_LEVELS
+    def chunk_paths(self, us, frame=None):
+        return [self.rail_paths(us[self.chunk_rings_at(0, len(us) - 1, stride)], frame)
+                for stride, _ in LOD_LEVELS]
+
+    # the rings of every chunk in us, which has every ring of self.us and maybe more between them
+    def split_chunks(self, us):
+        ends = np.searchsorted(us, self.us[self.chunks])
+        return [us[first:last+1] for first, last in ends]
+
+    # space the rings of chunks anew between their first and last ring, which stay
+    def respace_chunks(self, chunks):
+        pieces = [self.us[first:last] for first, last in self.chunks]
+        for k in chunks:
+            first, last = self.chunks[k]
+            pieces[k] = adaptive_us(self.spline, self.tolerance, self.reach, self.max_step,
+                                    self.us[first], self.us[last])[:-1]
+        starts = np.cumsum([0] + [len(piece) for piece in pieces])
+        self.us = np.concatenate(pieces + [self.us[-1:]])
+        self.chunks = np.stack([starts[:-1], starts[1:]], axis=-1)
+
+    # axis aligned box around both rails of every chunk, (K x 2 x 3) lower and upper corners.
+    # the same for every frame type
+    def update_bounds(self, chunks):
+        pad = self.reach
+        for k in chunks:
+            first, last = self.chunks[k]
+            centers = self.spline.coordinates(self.us[first:last+1])
+            self.bounds[k, 0] = centers.min(axis=0) - pad
+            self.bounds[k, 1] = centers.max(axis=0) + pad
+
+    # pick the level of every chunk from its distance to the camera at eye
+    def update_lod(self, eye):
+        eye = np.asarray(eye, dtype=float)
+        # distance to the box, 0 inside it
+        gap = np.maximum(np.maximum(self.bounds[:, 0] - eye, eye - self.bounds[:, 1]), 0)
+        distance = np.linalg.norm(gap, axis=-1)
+        # coarser only past the far edge of a band, finer only past its near edge
+        coarsest = np.searchsorted(self.lod_distances*(1 - self.lod_hysteresis), distance)
+        finest = np.searchsorted(self.lod_distances*(1 + self.lod_hysteresis), distance)
+        levels = np.clip(self.levels, finest, coarsest)
+        changed = np.nonzero(levels != self.levels)[0]
+        self.levels = levels
+        self.geometry.show_chunks(changed, self.levels, self.in_view)
+
+    # hide the chunks (and their plates) whose bounding box is outside the view frustum of
+    # view_projection (window.projection @ window.view)
+    def cull(self, view_projection):
+        in_view = boxes_in_frustum(frustum_planes(view_projection), self.bounds)
+        changed = np.nonzero(in_view != self.in_view)[0]
+        self.in_view = in_view
+        if len(changed) > 0:
+            self.geometry.show_chunks(changed, self.levels, self.in_view)
+            self.geometry.show_plates(self.in_view, self.plate_chunks)
+
+    # plates sit about plate_spacing apart in arc length, evened out to fit the track
+    def place_plates(self):
+        length = self.spline.cumulative_lengths[-1]
+        n_plates = max(int(round(length/self.plate_spacing)), 1)
+        dlength = length/n_plates
+
+        self.plate_us = self.spline.inv_length_many(dlength*np.arange(n_plates + (not self.spline.closed)))
+        self.plate_chunks = np.searchsorted(self.us[self.chunks[:, 0]], self.plate_us, side="right") - 1
+
+    # model matrix of every plate in a frame type
+    def plate_matrices(self, frame=None):
+        centers = self.spline.coordinates(self.plate_us)
+        x, y, z = np.moveaxis(self.spline.frame_table(frame or self.frame).lookup(self.plate_us), -2, 0)
+        return frame_matrices(centers + 0.03*y, z, y)
+
+    # draw geometry instead of the current one
+    def swap(self, geometry):
+        if geometry is not self.geometry:
+            self.geometry.hide()
+        self.geometry = geometry
+        self.frame = geometry.frame
+        self.geometries[geometry.frame] = geometry
+        self.geometry.show_chunks(range(len(self.chunks)), self.levels, self.in_view)
+        self.geometry.show_plates(self.in_view, self.plate_chunks)
+
+    # start building the rail of a frame type (default: the current one) in the background.
+    # the current rail keeps drawing until poll() swaps the new one in
+    def rebuild(self, frame=None):
+        self.cancel(wait=False)
+        self.pending = RailGeometry(self, frame or self.frame)
+        steps = self.pending.compute()
+        self.worker = None
+        if self.threaded:
+            try:
+                self.worker = threading.Thread(target=_exhaust, args=(steps,), daemon=True)
+                self.worker.start()
+            except RuntimeError:  # no threads on this platform, or too many
+                self.worker = None
+        # main thread work left: compute steps without a worker, then the uploads
+        self.steps = steps if self.worker is None else None
+        self.uploads = None
+
+    # drop the pending rebuild. with wait, also wait for its worker and every worker cancelled before,
+    # so nothing reads the spline or the rail behind the caller's back any more.
+    # returns the frame type it was building, or None
+    def cancel(self, wait=True):
+        pending = self.pending
+        if pending is not None:
+            pending.delete()  # the worker stops after the step it is on, its geometry is thrown away
+            if self.worker is not None:
+                self.stopping.append(self.worker)
+            self.pending = self.worker = self.steps = self.uploads = None
+        if wait:
+            for worker in self.stopping:
+                worker.join()
+            self.stopping = []
+        return None if pending is None else pending.frame
+
+    # advance the pending rebuild by at most budget seconds of main thread work.
+    # returns True when it was swapped in
+    def poll(self, budget=0.005):
+        pending = self.pending
+        if pending is None:
+            return False
+        start = time.perf_counter()
+        if not pending.computed:
+            if self.worker is not None:
+                if self.worker.is_alive():
+                    return False
+                # the worker stopped short (the thread printed the error): go on here instead
+                self.worker = None
+                self.steps = pending.compute()
+            for _ in self.steps:
+                if time.perf_counter() - start > budget:
+                    return False
+        if self.uploads is None:
+            self.uploads = pending.upload()
+        for _ in self.uploads:
+            if time.perf_counter() - start > budget:
+                return False
+        self.pending = None
+        old = self.geometries.get(pending.frame)
+        self.swap(pending)
+        if old is not None and old is not pending:
+            old.delete()
+        return True
+
+    # move to the next frame type: at once when it was built before, else in the background
     def switch_frame(self):
-        if self.frame == "up_frame":
-            self.frame = "frenet_frame" 
+        current = self.pending.frame if self.pending is not None else self.frame
+        frame = FRAME_TYPES[(FRAME_TYPES.index(current) + 1) % len(FRAME_TYPES)]
+        if frame in self.geometries:
+            self.cancel(wait=False)
+            self.swap(self.geometries[frame])
         else:
-            self.frame = "up_frame"
-        
-        for obj in self.objects:
-            obj.delete()
-        self.create_rail()
+            self.rebuild(frame)
+
+    # move pass point i of the spline, and the rail with it. a pending rebuild reads the spline, so
+    # it is stopped before the edit and started again after it
+    def update_point(self, i, new_xyz):
+        rebuilding = self.cancel()
+        self.update_ranges(self.spline.update_point(i, new_xyz), rebuilding)
+
+    # rebuild after spline.update_point. ranges are the (u0, u1) it returned: chunks overlapping
+    # them get new rings, spaced and refined for the track as it is now, the rest are refined and
+    # moved only if their frame changed. other frame types are rebuilt when next shown.
+    # rebuilding: frame type of a rebuild cancel()ed before the edit, started again here
+    def update_ranges(self, ranges, rebuilding=None):
+        rebuilding = self.cancel() or rebuilding
+        u_first, u_last = self.us[self.chunks[:, 0]], self.us[self.chunks[:, 1]]
+        changed = np.zeros(len(self.chunks), dtype=bool)
+        for u0, u1 in ranges:
+            changed |= (u_first <= u1) & (u_last >= u0)
+        changed = np.nonzero(changed)[0]
+        self.respace_chunks(changed)
+        self.update_bounds(changed)
+        moved = range(len(self.chunks)) if self.frame == "rmf_frame" else changed
+        self.geometry.place_chunks(moved)
+        self.geometry.show_chunks(moved, self.levels, self.in_view)
+        # arc length moved along the whole track after the edit
+        self.place_plates()
+        self.geometry.plate_matrices = self.plate_matrices()
+        self.geometry.show_plates(self.in_view, self.plate_chunks)
+
+        for other_frame, built in list(self.geometries.items()):
+            if built is not self.geometry:
+                built.delete()
+                del self.geometries[other_frame]
+        if rebuilding is not None:
+            self.rebuild(rebuilding)
+
 
-class Cart:
+# n_cars cars, spacing apart in arc length, behind the front car at arc length s
+class Train:
+    def __init__(self, n_cars=10, spacing=0.45, s=0.0):
+        self.n_cars = n_cars
+        self.spacing = spacing
+        self.s = s
+
+
+# every car of every train as instances of one cube. move() places all of them with one
+# spline and frame lookup and a single write of the instance buffer
+class TrainSet:
     def __init__(self, spline, frame="up_frame", batch=None):
         self.spline = spline
         self.frame = frame
         self.color = (0.2, 0.2, 0.2, 0.2)
-        self.cartBatch = batch
-        self.create_cart()
-        
-    def create_cart(self):
-        self.cart = geometry.Cube(width= 0.1, height=0.2, depth= 0.4, batch=self.cartBatch, color=self.color)
-        if self.frame == "up_frame":
-            x, y, z = self.spline.up_frame(0)
-        if self.frame == "frenet_frame":
-            x, y, z = self.spline.frenet_frame(0)
-        self.cart.matrix = Mat4.from_translation(0.05*Vec3(*y)) @ centerNvector(Mat4, self.spline.coordinate(0), z, x)
-        
-    def move(self, u):
-        if self.frame == "up_frame":
-            x, y, z = self.spline.up_frame(u)
-        if self.frame == "frenet_frame":
-            x, y, z = self.spline.frenet_frame(u)
-        self.cart.matrix = Mat4.from_translation(0.05*Vec3(*y)) @ centerNvector(Mat4, self.spline.coordinate(u), z, x)
-    
-    def switch_frame(self): 
-        if self.frame == "up_frame":
-            self.frame = "frenet_frame" 
-        else:
-            self.frame = "up_frame"
-        self.cart.delete()
-        self.create_cart()    
+        self.trainBatch = batch
+        self.trains = []
+        # per car: which train it belongs to and its arc length behind that train's front
+        self.car_train = np.zeros(0, dtype=int)
+        self.car_offsets = np.zeros(0)
+        vertices, normals, indices = geometry.box_mesh(width=0.1, height=0.2, depth=0.4)
+        self.cars = geometry.InstancedModel(vertices, normals, indices, transforms=np.zeros((0, 4, 4)),
+                                            batch=batch, color=self.color)
+
+    def add(self, n_cars=10, spacing=0.45, s=0.0):
+        train = Train(n_cars, spacing, s)
+        self.car_train = np.append(self.car_train, np.full(n_cars, len(self.trains)))
+        self.car_offsets = np.append(self.car_offsets, spacing*np.arange(n_cars))
+        self.trains.append(train)
+        self.move()
+        return train
+
+    # u of every car, trains in the order they were added, each front car first
+    def car_us(self):
+        fronts = np.array([train.s for train in self.trains])
+        return self.spline.inv_length_many(fronts[self.car_train] - self.car_offsets)
+
+    def move(self):
+        if not self.trains:
+            return
+        u = self.car_us()
+        centers = self.spline.coordinates(u)
+        x, y, z = np.moveaxis(self.spline.frame_table(self.frame).lookup(u), -2, 0)
+        self.cars.set_transforms(frame_matrices(centers + 0.05*y, z, x))
+
+    # next frame type, or the given one
+    def switch_frame(self, frame=None):
+        self.frame = frame or FRAME_TYPES[(FRAME_TYPES.index(self.frame) + 1) % len(FRAME_TYPES)]
+        self.move()
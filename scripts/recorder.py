@@ -0,0 +1,106 @@
+# Ride recordings: one fixed size record per tick in a binary file, written and read through
+# np.memmap so long recordings never have to fit in memory.
+#
+# file layout: HEADER (padded to HEADER_SIZE bytes), then `count` records of RECORD
+import bisect
+import numpy as np
+
+MAGIC = b"RMTRAJ02"
+HEADER_SIZE = 64
+HEADER = np.dtype([("magic", "S8"), ("record_size", "<u8"), ("count", "<u8")])
+RECORD = np.dtype([
+    ("time", "<f8"),
+    ("s", "<f8"),
+    ("u", "<f8"),
+    ("position", "<f8", 3),
+    ("quat", "<f8", 4),                 # cart frame as [w, x, y, z], see FrameTable.lookup_quat
+    ("camera_translation", "<f8", 3),   # camera.tx, ty, tz
+    ("camera_quat", "<f8", 4),          # camera.curquat
+    ("camera_dolly", "<f8"),
+    ("camera_riding", "u1"),            # 1 when the camera rode the cart (first person view)
+])
+
+
+def _header(count):
+    header = np.zeros(1, dtype=HEADER)
+    header["magic"] = MAGIC
+    header["record_size"] = RECORD.itemsize
+    header["count"] = count
+    return header.tobytes().ljust(HEADER_SIZE, b"\0")
+
+
+# appends records to a preallocated memory mapped file, doubling it whenever it is full.
+# the header count is written every header_every records and whenever the file grows, so a
+# recording cut short by a crash still reads back all but the last few records
+class TrajectoryRecorder:
+    def __init__(self, path, capacity=4096, header_every=120):
+        self.path = path
+        self.count = 0
+        self.header_every = header_every
+        self.file = open(path, "w+b")
+        self.file.write(_header(0))
+        self._map(capacity)
+
+    def _map(self, capacity):
+        self.capacity = capacity
+        self.file.truncate(HEADER_SIZE + capacity*RECORD.itemsize)
+        self.records = np.memmap(self.file, dtype=RECORD, mode="r+", offset=HEADER_SIZE, shape=(capacity,))
+
+    def append(self, time, s, u, position, quat, camera_translation, camera_quat, camera_dolly, camera_riding):
+        if self.count == self.capacity:
+            self.flush()
+            del self.records
+            self._map(2*self.capacity)
+        self.records[self.count] = (time, s, u, position, quat, camera_translation, camera_quat, camera_dolly,
+                                    camera_riding)
+        self.count += 1
+        if self.count % self.header_every == 0:
+            self._write_header()
+
+    # records written through the map are in the page cache already, only the count has to follow
+    def _write_header(self):
+        self.file.seek(0)
+        self.file.write(_header(self.count))
+        self.file.flush()
+
+    # make everything recorded so far readable by TrajectoryReader, even after a system crash
+    def flush(self):
+        self.records.flush()
+        self._write_header()
+
+    # drop the unused preallocated records
+    def close(self):
+        self.flush()
+        del self.records
+        self.file.truncate(HEADER_SIZE + self.count*RECORD.itemsize)
+        self.file.close()
+
+
+class TrajectoryReader:
+    def __init__(self, path):
+        header = np.fromfile(path, dtype=HEADER, count=1)
+        if len(header) == 0 or header["magic"][0] != MAGIC:
+            raise ValueError(f"{path} is not a trajectory recording")
+        if header["record_size"][0] != RECORD.itemsize:
+            raise ValueError(f"{path} has records of {header['record_size'][0]} bytes, expected {RECORD.itemsize}")
+        self.count = int(header["count"][0])
+        if self.count == 0:
+            self.records = np.zeros(0, dtype=RECORD)  # nothing to map past the header
+        else:
+            self.records = np.memmap(path, dtype=RECORD, mode="r", offset=HEADER_SIZE, shape=(self.count,))
+        self.times = self.records["time"]
+        self.duration = float(self.times[-1]) if self.count else 0.0
+
+    def __len__(self):
+        return self.count
+
+    # index of the last record at or before time. a binary search touches only ~log2(count) pages
+    def index(self, time):
+        i = bisect.bisect_right(self.times, time) - 1
+        return min(max(i, 0), self.count - 1)
+
+    # the record shown at time. times past the end hold the last record
+    def at(self, time):
+        if self.count == 0:
+            raise ValueError("the recording has no records")
+        return self.records[self.index(time)]
@@ -0,0 +1,72 @@
+# Headless roller coaster simulation: same track and energy based physics as main.py,
+# without a window, as fast as the CPU allows.
+#
+#   python -m scripts.simulate --track points.csv --dt 0.001 --duration 100 --output trajectory.npz
+#
+# The trajectory is saved as arrays t, s, u, position (steps x 3), frame (steps x 3 x 3) and speed.
+import argparse
+import time
+import numpy as np
+from scripts.spline import NatCubeSpline, SplineCursor
+from scripts.frames import FRAME_TYPES
+from scripts.loader import load_track, DEFAULT_TRACK, TRACK_HELP
+
+
+# same loop as main.update: the cursor moves by spline.speed(u)*dt and restarts after a lap.
+# with stop_after_lap the ride ends on the first step that completes a lap instead.
+# frame=None leaves out the frames, for callers that only need the path and the speed.
+# the speed is spline.speed_at the cursor's segment and t, which spares finding them from u
+def simulate(spline, dt, duration, g=9.8, frame="frenet_frame", stop_after_lap=False):
+    n_steps = int(round(duration / dt))
+    smax = spline.cumulative_lengths[-1]
+    cursor = SplineCursor(spline)
+
+    s = [0.0] * (n_steps + 1)
+    u = [0.0] * (n_steps + 1)
+    speed = [0.0] * (n_steps + 1)
+    s[0], u[0], speed[0] = cursor.s, cursor.u, spline.speed_at(cursor.seg, cursor.t, g)
+    for i in range(1, n_steps + 1):
+        if cursor.s >= smax:
+            cursor.reset()
+        cursor.advance(speed[i-1] * dt)
+        s[i], u[i] = cursor.s, cursor.u
+        speed[i] = spline.speed_at(cursor.seg, cursor.t, g)
+        if stop_after_lap and (cursor.laps > 0 or cursor.s >= smax):
+            n_steps = i
+            break
+    s, u, speed = np.array(s[:n_steps+1]), np.array(u[:n_steps+1]), np.array(speed[:n_steps+1])
+
+    trajectory = {
+        "t": np.arange(n_steps + 1) * dt,
+        "s": s,
+        "u": u,
+        "position": spline.coordinates(u),
+        "speed": speed,
+    }
+    if frame is not None:
+        trajectory["frame"] = spline.frames(u, frame)
+    return trajectory
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the roller coaster simulation without a window")
+    parser.add_argument("--track", help=TRACK_HELP)
+    parser.add_argument("--dt", type=float, default=1/120, help="time step in seconds")
+    parser.add_argument("--duration", type=float, default=100, help="simulated time in seconds")
+    parser.add_argument("--gravity", type=float, default=9.8)
+    parser.add_argument("--frame", choices=FRAME_TYPES, default="frenet_frame")
+    parser.add_argument("--output", default="trajectory.npz")
+    args = parser.parse_args(argv)
+
+    points = DEFAULT_TRACK if args.track is None else load_track(args.track)
+    start = time.perf_counter()
+    spline = NatCubeSpline(points)
+    trajectory = simulate(spline, args.dt, args.duration, g=args.gravity, frame=args.frame)
+    elapsed = time.perf_counter() - start
+
+    np.savez(args.output, **trajectory)
+    print(f"{len(trajectory['t'])} steps of {args.duration}s simulated in {elapsed:.2f}s -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import numpy as np
+
+
+# smallest value of every run of equal, sorted owners. every owner in range(n) has a run
+def _min_per_owner(owner, values, n):
+    starts = np.searchsorted(owner, np.arange(n))
+    return np.minimum.reduceat(values, starts)
+
+
+# squared distance from every query to its box, 0 inside it
+def _box_squared_distance(queries, lo, hi):
+    gap = np.maximum(np.maximum(lo - queries, queries - hi), 0)
+    return np.einsum('ij,ij->i', gap, gap)
+
+
+def _squared_distance(a, b):
+    d = a - b
+    return np.einsum('...j,...j->...', d, d)
+
+
+# Index over the segments of a curve for nearest point queries.
+# boxes: (segments x 2 x dim) bounding box of every segment, samples: (segments x m+1 x dim)
+# points on every segment, its end points first and last.
+# Every query gets an upper bound on its distance to the curve from points on it, and only the
+# segments whose box is no farther than that are candidates. Up to scan_limit segments the bound
+# is the nearest pass point and every box is checked. Longer curves keep a tree of boxes, node k
+# of level l around segments k 2^l .. (k+1) 2^l - 1: each level tightens the bound by the middle
+# sample of every node it keeps, keeps the nodes within the bound and splits them in two.
+class SegmentTree:
+    def __init__(self, boxes, samples, scan_limit=128):
+        self.samples = np.ascontiguousarray(samples, dtype=float)
+        self.n_segments = len(boxes)
+        self.sample_axes = np.ascontiguousarray(np.moveaxis(self.samples, -1, 0))
+        self.scan = self.n_segments <= scan_limit
+        # boxes grown by more than rounding, so the sample that bounds a query is inside its boxes
+        # and every query keeps a candidate
+        pad = 1e-9 * max(1.0, np.abs(boxes).max())
+        boxes = np.stack([boxes[:, 0] - pad, boxes[:, 1] + pad], axis=1)
+        # pass points, and the segment boxes as centers and half sizes, for the scan
+        self.anchors = np.concatenate([self.samples[:, 0], self.samples[-1:, -1]])
+        self.anchor_norms = np.einsum('ij,ij->i', self.anchors, self.anchors)
+        self.centers, self.halves = (boxes[:, 1] + boxes[:, 0])/2, (boxes[:, 1] - boxes[:, 0])/2
+        # (lower corners, upper corners, middle sample of the middle segment) of every node
+        lo, hi = boxes[:, 0], boxes[:, 1]
+        middles = self.samples[:, self.samples.shape[1] // 2]
+        self.levels = [(lo, hi, middles)]
+        while len(lo) > 1:
+            if len(lo) % 2:
+                lo, hi = np.append(lo, lo[-1:], axis=0), np.append(hi, hi[-1:], axis=0)
+            lo, hi = np.minimum(lo[::2], lo[1::2]), np.maximum(hi[::2], hi[1::2])
+            size = 1 << len(self.levels)
+            self.levels.append((lo, hi, middles[np.minimum(np.arange(len(lo))*size + size//2, len(middles) - 1)]))
+
+    # candidate (query, segment) pairs, sorted by query, and the distances of the query to the
+    # samples of the segment (pairs x m+1). The nearest curve point of every query is on one of
+    # its candidate segments, and no farther than the nearest of their samples
+    def candidates(self, queries, chunk_size=4096):
+        queries = np.asarray(queries, dtype=float).reshape(-1, self.samples.shape[-1])
+        if self.scan:
+            chunk_size = max(1, min(chunk_size, (1 << 20) // self.n_segments))
+        results = []
+        for start in range(0, len(queries), chunk_size):
+            chunk = queries[start:start+chunk_size]
+            owner, seg = self._scan(chunk) if self.scan else self._descend(chunk)
+            d2 = 0
+            for axis, column in zip(self.sample_axes, chunk.T):
+                d = axis[seg] - column[owner, np.newaxis]
+                d2 = d2 + d*d
+            results.append((owner + start, seg, np.sqrt(d2)))
+        return tuple(np.concatenate(parts) for parts in zip(*results))
+
+    # every segment of every query, bounded by the nearest pass point
+    def _scan(self, queries):
+        # |p - q|^2 up to |q|^2, by one product. it only picks a point, whose distance is then exact
+        nearest = np.argmin(self.anchor_norms - 2*queries @ self.anchors.T, axis=1)
+        upper2 = _squared_distance(self.anchors[nearest], queries)
+        lower2 = 0
+        for k in range(queries.shape[-1]):
+            gap = np.abs(queries[:, k:k+1] - self.centers[:, k])
+            gap -= self.halves[:, k]
+            np.maximum(gap, 0, out=gap)
+            lower2 = lower2 + gap*gap
+        return np.nonzero(lower2 <= upper2[:, np.newaxis])
+
+    def _descend(self, queries):
+        Q = len(queries)
+        owner, node = np.arange(Q), np.zeros(Q, dtype=int)
+        upper2 = np.full(Q, np.inf)
+        for level in range(len(self.levels) - 1, -1, -1):
+            lo, hi, middles = self.levels[level]
+            q = queries[owner]
+            upper2 = np.minimum(upper2, _min_per_owner(owner, _squared_distance(middles[node], q), Q))
+            keep = _box_squared_distance(q, lo[node], hi[node]) <= upper2[owner]
+            owner, node = owner[keep], node[keep]
+            if level > 0:
+                # both children, the second only when the level below has it
+                owner, node = np.repeat(owner, 2), (np.repeat(node, 2)*2 + np.tile([0, 1], len(node)))
+                inside = node < len(self.levels[level-1][0])
+                owner, node = owner[inside], node[inside]
+        return owner, node
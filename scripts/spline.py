@@ -1,27 +1,47 @@
+import os
+import warnings
 import numpy as np
-import sympy as sp
 from math import sqrt
-from scripts.utils import normalize, np2sp, integrate
-
-
-x = sp.symbols('x')
-
-def Bezier1D(cp0, cp1, cp2, cp3):
-    basis_mat = np.array([[1, -3, 3, -1],
-                        [0, 3, -6, 3],
-                        [0, 0, 3, -3],
-                        [0, 0, 0, 1]])
-    cp_mat = np.transpose(np.vstack([cp0, cp1, cp2, cp3]))
-    poly_mat = cp_mat @ basis_mat
-    
-    polynomial = np.polynomial.Polynomial(poly_mat[0].tolist())
-    return polynomial
+from scripts.cache import track_key, save_arrays, load_arrays
+from scripts.frames import FrameTable
+from scripts.spatial import SegmentTree
+from scripts.utils import normalize_many, integrate_segments, hermite, monotone_slopes, \
+    solve_tridiagonal, solve_cyclic_tridiagonal
+
+
+# everything the constructor computes, stored by the track cache
+CACHED_ARRAYS = ["control_points", "coefs", "dcoefs", "ddcoefs", "speed2_coefs", "bboxes",
+                 "cumulative_lengths", "segment_length_errors", "length_error", "table_counts", "table_seg",
+                 "table_t", "table_local", "table_dsdu", "table_offsets", "table_u", "table_s", "arclength_error",
+                 "hmax", "hmargin"]
+
+BEZIER_BASIS = np.array([[1, -3, 3, -1],
+                         [0, 3, -6, 3],
+                         [0, 0, 3, -3],
+                         [0, 0, 0, 1]])
+
+# power basis coefficients of every segment at once.
+# geometry: (segments x 4 x dim) bezier points -> (segments x 4 x dim), coefs[:, k] multiplies t^k
+def bezier_coefficients(geometry):
+    return np.einsum('jk,sjd->skd', BEZIER_BASIS, geometry)
+
+def polyval_segments(coefs, seg, t):
+    # horner scheme over (segments x order x dim) coefficient tensor
+    c = coefs[seg]
+    t = t[:, np.newaxis]
+    result = c[:, -1]
+    for k in range(coefs.shape[1] - 2, -1, -1):
+        result = result * t + c[:, k]
+    return result
 
 
 class NatCubeSpline:
-    def __init__(self, points): # frame smoothness: 0~100
-        self.pass_points = points
-        self.point_T = np.transpose(points)
+    def __init__(self, points, arclength_tol=1e-5, integration_tol=1e-10, cache_dir=None): # frame smoothness: 0~100
+        self.pass_points = np.array(points, dtype=float) # own copy, update_point edits it
+        self.arclength_tol = arclength_tol
+        self.integration_tol = integration_tol
+        self.cache_dir = cache_dir
+        self.point_T = np.transpose(self.pass_points)
         self.N = points.shape[0]
         self.dim = points.shape[1]
         self.umax = self.N-1
@@ -29,164 +49,442 @@ class NatCubeSpline:
         self.du = 0
         self.closed = np.array_equal(points[0], points[-1])
         self.hmax = max(self.point_T[2])
+        self.frame_tables = {}
+        self.segment_tree = None
+        self._heights = None  # python float copy of the height polynomials, see speed_at
+
+        if cache_dir is not None:
+            self.cache_key = track_key(self.pass_points, arclength_tol, integration_tol)
+            path = self.cache_path()
+            if os.path.exists(path):
+                self.__dict__.update(load_arrays(path))
+                return
         self.set_control_points()
-        self.set_hmax(div=1000)
+        self.set_hmax()
+        if cache_dir is not None:
+            save_arrays(path, {name: getattr(self, name) for name in CACHED_ARRAYS})
+
+    # cache file of this track, or of one of its frame tables
+    def cache_path(self, frame=None):
+        name = self.cache_key if frame is None else f"{self.cache_key}.{frame}"
+        return os.path.join(self.cache_dir, name + ".npz")
     
     def limit_u(self, u):
         limit = (u - self.umin) % (self.umax - self.umin) + self.umin
         return u
 
+    # Eliminating the second control points from the tangency constraints leaves a
+    # tridiagonal system in the first control points (cyclic when the track is closed),
+    # so all dimensions are solved together in O(N).
     def set_control_points(self):
-        N = self.N
-        dim = self.dim
-        A = np.zeros((2*N - 2, 2*N - 2))
-        B = np.zeros((2*N - 2, dim)) 
-
-        for i in range(N - 2):
-            # Tangency constraint
-            A[i][2*i + 1] = 1
-            A[i][2*(i + 1)] = 1
-            B[i] = 2 * self.point_T[:, i+1] 
-
-            # Curvature constraint
-            A[i + N - 2][2*i] = 1
-            A[i + N - 2][2*i + 1] = -2
-            A[i + N - 2][2*(i + 1)] = 2
-            A[i + N - 2][2*(i + 1)+1] = -1 
-
-        # extra 2 more constraints
+        n = self.N - 1  # number of segments
+        lower, diag, upper, rhs = self._control_system()
         if self.closed:
-            A[2*N - 4][0] = 1
-            A[2*N - 4][-1] = 1
-            B[2*N - 4] = 2 * self.point_T[:, 0]
-
-            A[2*N - 3][-2] = 1
-            A[2*N - 3][-1] = -2
-            A[2*N - 3][0] = 2
-            A[2*N - 3][1] = -1
+            first = solve_cyclic_tridiagonal(lower, diag, upper, rhs)
         else:
-            A[2*N - 4][0] = -2
-            A[2*N - 4][1] = 1
-            B[2*N - 4] = -self.point_T[:, 0]
-
-            A[2*N - 3][-2] = 1
-            A[2*N - 3][-1] = -2
-            B[2*N - 3] = -self.point_T[:, -1]
+            first = solve_tridiagonal(lower, diag, upper, rhs)
 
-        control_points = np.stack([np.linalg.solve(A, B[:, d]) for d in range(dim)], axis=-1)
-        self.control_points = control_points.reshape(-1, 2, dim)
+        self.control_points = np.empty((n, 2, self.dim))
+        self.control_points[:, 0] = first
+        self._set_second_control_points(np.arange(n))
         self.generate_bezier()
 
-    def generate_bezier(self):
-        self.curve_list = []
-        self.sp_curve_list = []
-        
-        for d in range(self.dim):
-            segments = []
-            sp_segments= []
-            for i in range(self.N-1):
-                curve = Bezier1D(self.pass_points[i][d], self.control_points[i][0][d], self.control_points[i][1][d], self.pass_points[i+1][d])
-                segments.append(curve)
-                sp_segments.append(np2sp(curve))
-            self.curve_list.append(segments)
-            self.sp_curve_list.append(sp_segments)
+    # coefficients, right hand side (segments x dim) of the first control point system
+    def _control_system(self):
+        return self._control_matrix() + (self._control_rhs(np.arange(self.N - 1)),)
+
+    # lower, main and upper diagonal of the first control point system
+    def _control_matrix(self):
+        n = self.N - 1
+        diag = np.full(n, 4.0)
+        lower = np.ones(n)
+        upper = np.ones(n)
+        if not self.closed:
+            if n == 1:
+                diag[0] = 3
+            else:
+                diag[0] = 2
+                diag[-1] = 7
+                lower[-1] = 2
+        return lower, diag, upper
+
+    # rows of the right hand side of the first control point system
+    def _control_rhs(self, rows):
+        n = self.N - 1
+        P = self.pass_points
+        rhs = 4*P[rows] + 2*P[rows+1]
+        if not self.closed:
+            if n == 1:
+                rhs[rows == 0] = 2*P[0] + P[1]
+            else:
+                rhs[rows == 0] = P[0] + 2*P[1]
+                rhs[rows == n-1] = 8*P[-2] + P[-1]
+        return rhs
+
+    # second control points of segments seg from the tangency constraints
+    def _set_second_control_points(self, seg):
+        n = self.N - 1
+        P = self.pass_points
+        first = self.control_points[:, 0]
+        if self.closed:
+            self.control_points[seg, 1] = 2*P[seg+1] - first[(seg+1) % n]
+        else:
+            inner = seg[seg < n-1]
+            self.control_points[inner, 1] = 2*P[inner+1] - first[inner+1]
+            if seg[-1] == n-1:
+                self.control_points[n-1, 1] = (first[n-1] + P[n]) / 2
 
+    def generate_bezier(self):
+        n = self.N - 1
+        self.coefs = np.empty((n, 4, self.dim))
+        self.dcoefs = np.empty((n, 3, self.dim))
+        self.ddcoefs = np.empty((n, 2, self.dim))
+        self.speed2_coefs = np.empty((n, 5))
+        self._set_segment_polynomials(np.arange(n))
+
+        self.setup_bounding_boxes()
         self.setup_differentials()
 
+    def _set_segment_polynomials(self, seg):
+        P = self.pass_points
+        geometry = np.stack([P[seg], self.control_points[seg, 0], self.control_points[seg, 1], P[seg+1]], axis=1)
+        coefs = bezier_coefficients(geometry)
+        dcoefs = coefs[:, 1:] * np.array([1, 2, 3])[:, np.newaxis]
+        self.coefs[seg] = coefs
+        self.dcoefs[seg] = dcoefs
+        self.ddcoefs[seg] = dcoefs[:, 1:] * np.array([1, 2])[:, np.newaxis]
+
+        # |B'(t)|^2 is a quartic per segment: sum over dimensions of dB_d(t)^2
+        speed2 = np.zeros((len(seg), 5))
+        for i in range(3):
+            for j in range(3):
+                speed2[:, i+j] += np.sum(dcoefs[:, i] * dcoefs[:, j], axis=-1)
+        self.speed2_coefs[seg] = speed2
+
+    # exact axis aligned box of every segment, shape (segments, 2, dim) as (min, max).
+    # each coordinate is a cubic in t, so its extrema are at t = 0, 1 or a root of the derivative
+    def setup_bounding_boxes(self):
+        self.bboxes = self._bounding_boxes(np.arange(self.N-1))
+
+    def _bounding_boxes(self, seg):
+        c, b, a = self.dcoefs[seg, 0], self.dcoefs[seg, 1], self.dcoefs[seg, 2]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            disc = np.sqrt(b*b - 4*a*c)
+            q = -0.5 * (b + np.where(b < 0, -disc, disc))
+            roots = np.stack([q / a, c / q, -c / b], axis=1)
+        # roots outside [0, 1] (or nonexistent) fall back to an end point, which is a candidate anyway
+        roots = np.clip(np.nan_to_num(roots, nan=0.0, posinf=0.0, neginf=0.0), 0, 1)
+        t = np.concatenate([np.zeros_like(roots[:, :1]), np.ones_like(roots[:, :1]), roots], axis=1)
+
+        coefs = self.coefs[seg, np.newaxis]
+        values = ((coefs[:, :, 3]*t + coefs[:, :, 2])*t + coefs[:, :, 1])*t + coefs[:, :, 0]
+        return np.stack([values.min(axis=1), values.max(axis=1)], axis=1)
+
+    # indices of segments whose bounding box overlaps the box [lo, hi]
+    def overlapping_segments(self, lo, hi):
+        inside = np.all((self.bboxes[:, 0] <= hi) & (self.bboxes[:, 1] >= lo), axis=-1)
+        return np.nonzero(inside)[0]
+
+    # nearest point on the track for every row of points. A SegmentTree over the segment boxes lists
+    # the segments that may hold the nearest point, and the sample intervals of those that may get
+    # closer than the nearest sample are refined by newton on (B(u) - p).B'(u) = 0.
+    # returns u, the closest track points and the distances
+    def closest_points(self, points, samples_per_segment=8, iterations=4):
+        points = np.asarray(points, dtype=float)
+        shape = points.shape[:-1]
+        points = points.reshape(-1, self.dim)
+        density = samples_per_segment
+        if len(points) == 0:
+            return np.zeros(shape), np.zeros(shape + (self.dim,)), np.zeros(shape)
+
+        if self.segment_tree is None or self.segment_tree_density != density:
+            t = np.linspace(0, 1, density + 1)
+            seg = np.arange(self.N-1)[:, np.newaxis]
+            samples = self.coordinates((seg + t).ravel()).reshape(self.N-1, density + 1, self.dim)
+            self.segment_tree = SegmentTree(self.bboxes, samples)
+            self.segment_tree_density = density
+            # arc length of every sample interval, never shorter than its chord
+            lengths = self.segment_lengths(seg, t[:-1], t[1:])
+            self.segment_tree_lengths = np.maximum(lengths, np.linalg.norm(np.diff(samples, axis=1), axis=-1))
+            # the cubics about the track center (coefficients x dim x segments), and B.B' of every
+            # segment (6 coefficients x segments), laid out so the refinement works on whole rows
+            self.segment_tree_center = (self.bboxes[:, 0].min(axis=0) + self.bboxes[:, 1].max(axis=0))/2
+            coefs = self.coefs.copy()
+            coefs[:, 0] -= self.segment_tree_center
+            self.segment_tree_dot = np.zeros((6, self.N-1))
+            for i in range(4):
+                for k in range(3):
+                    self.segment_tree_dot[i+k] += np.sum(coefs[:, i]*self.dcoefs[:, k], axis=-1)
+            self.segment_tree_coefs = np.ascontiguousarray(coefs.transpose(1, 2, 0))
+
+        # an interval of arc length L between samples at distances d0 and d1 gets no closer than
+        # (d0 + d1 - L)/2, skip it when a sample is already closer than that (up to rounding: the
+        # intervals next to the nearest sample are never skipped)
+        owner, seg, d = self.segment_tree.candidates(points)
+        starts = np.searchsorted(owner, np.arange(len(points)))
+        best = np.minimum.reduceat(d.min(axis=1), starts)
+        bound = (d[:, :-1] + d[:, 1:] - self.segment_tree_lengths[seg])/2
+        pair, j = np.nonzero(bound <= (best*(1 + 1e-12) + 1e-12)[owner, np.newaxis])
+        owner, seg, d_lo, d_hi = owner[pair], seg[pair], d[pair, j], d[pair, j+1]
+
+        # newton runs inside every interval on g(t) = (B(t) - p).B'(t) = B.B' - p.B', a quintic.
+        # B' has (k+1) c[k+1] at t^k, so p.B' comes from p.c
+        lo = j / density
+        hi = lo + 1/density
+        p = (points - self.segment_tree_center).T[:, owner]
+        c = np.take(self.segment_tree_coefs, seg, axis=2)
+        pc = sum(c[:, k]*p[k] for k in range(self.dim))
+        g = np.take(self.segment_tree_dot, seg, axis=1)
+        g[:3] -= pc[1:] * np.arange(1, 4)[:, np.newaxis]
+        dg = g[1:] * np.arange(1, 6)[:, np.newaxis]
+
+        def horner(c, t):
+            result = c[-1]
+            for k in range(len(c) - 2, -1, -1):
+                result = result*t + c[k]
+            return result
+
+        t = (lo + hi) / 2
+        for _ in range(iterations):
+            slope = horner(dg, t)
+            step = np.divide(horner(g, t), slope, out=np.zeros_like(t), where=slope > 0)
+            t = np.clip(t - step, lo, hi)
+
+        # newton may stall on an interval end or a local maximum, keep the best of t and the ends
+        # (the samples). distances from B(t) - p, exact also next to the track
+        offset = horner(c, t) - p
+        d2 = np.einsum('ij,ij->j', offset, offset)
+        for end, end_d in ((lo, d_lo), (hi, d_hi)):
+            closer = end_d*end_d < d2
+            t[closer], d2[closer] = end[closer], end_d[closer]**2
+
+        # the first of the closest intervals of every query
+        starts = np.searchsorted(owner, np.arange(len(points)))
+        nearest = np.minimum.reduceat(d2, starts)
+        at = np.flatnonzero(d2 == nearest[owner])
+        first = at[np.searchsorted(owner[at], np.arange(len(points)))]
+        u = seg[first] + t[first]
+        closest = self.coordinates(u)
+        distance = np.linalg.norm(closest - points, axis=-1)
+        return u.reshape(shape), closest.reshape(shape + (self.dim,)), distance.reshape(shape)
+
     def setup_differentials(self):
-        self.ds_list = []    
-        self.cumulative_lengths = [0.0]
-
-        for i in range(self.N - 1):
-            ds_expr = sp.sqrt(sp.diff(self.sp_curve_list[0][i])**2 +
-                            sp.diff(self.sp_curve_list[1][i])**2 +
-                            sp.diff(self.sp_curve_list[2][i])**2)
-            ds_func = sp.lambdify(x, ds_expr, 'numpy') 
-
-            total = self.cumulative_lengths[-1] + integrate(ds_func, 0, 1, n_intervals=20)
-            self.cumulative_lengths.append(total)
-            self.ds_list.append(ds_func)
+        n_segments = self.N-1
+        seg = np.arange(n_segments)
+        segment_lengths, error = integrate_segments(self.segment_speed, seg, 0, 1, tol=self.integration_tol)
+        self.cumulative_lengths = np.concatenate([[0.0], np.cumsum(segment_lengths)])
+        # estimated absolute error of every segment's length and of cumulative_lengths[-1], from the quadrature
+        self.segment_length_errors = error
+        self.length_error = error.sum()
+        self.build_arclength_table()
+
+    # integral of |B'(t)| from t0 to t1 on segment seg, elementwise over broadcast arrays
+    def segment_lengths(self, seg, t0, t1):
+        return integrate_segments(self.segment_speed, seg, t0, t1, tol=self.integration_tol)[0]
+
+    # s(u) sampled on a uniform grid of knots inside every segment. Between knots s(u)
+    # and u(s) are cubic hermite interpolants with the exact derivatives |B'| and 1/|B'|,
+    # limited to stay monotone. Each segment doubles its knot count until both directions
+    # are within arclength_tol (in length units) at the interval midpoints.
+    # Knots are stored by segment and local arc length, so shifting cumulative_lengths
+    # does not invalidate them.
+    def build_arclength_table(self):
+        n_segments = self.N-1
+        self.arclength_error = 0.0
+        self.table_counts, self.table_seg, self.table_t, self.table_local, self.table_dsdu = \
+            self._arclength_rows(np.arange(n_segments))
+        # the end of the last segment closes the table
+        self.table_seg = np.append(self.table_seg, n_segments-1)
+        self.table_t = np.append(self.table_t, 1.0)
+        self.table_local = np.append(self.table_local, 0.0)
+        self.table_dsdu = np.append(self.table_dsdu, self.segment_speed(n_segments-1, 1.0))
+        self._finish_arclength_table()
+
+    # flat u and s knots from the per segment data
+    def _finish_arclength_table(self):
+        self.table_offsets = np.concatenate([[0], np.cumsum(self.table_counts)])
+        self.table_local[-1] = self.cumulative_lengths[-1] - self.cumulative_lengths[-2]
+        self.table_u = self.table_seg + self.table_t
+        self.table_s = self.cumulative_lengths[self.table_seg] + self.table_local
+
+    # knots of the sorted segments seg (without their end points), concatenated in order.
+    # every segment starts at samples_per_segment intervals (one count, or one per segment). the interpolation error falls as the
+    # fourth power of the interval, so a segment above arclength_tol goes straight to the power of
+    # two count that should fit (at least double). segments with the same count are done together
+    def _arclength_rows(self, seg, samples_per_segment=4, max_samples_per_segment=256, chunk_size=2**18):
+        counts = np.zeros(len(seg), dtype=int)
+        m = np.zeros(len(seg), dtype=int) + samples_per_segment
+        finished = []  # (positions in seg, t, local s, speed) per group
+        capped = 0     # segments that stopped at max_samples_per_segment above arclength_tol
+
+        pending = np.arange(len(seg))
+        while len(pending) > 0:
+            for size in np.unique(m[pending]):
+                group = pending[m[pending] == size]
+                step = max(1, chunk_size // size)
+                for start in range(0, len(group), step):
+                    rows = group[start:start+step]
+                    t, local, speed, error = self._arclength_knots(seg[rows], size)
+                    done = (error <= self.arclength_tol) | (size >= max_samples_per_segment)
+                    finished.append((rows[done], t, local[done], speed[done]))
+                    counts[rows[done]] = size
+                    if np.any(done):
+                        self.arclength_error = max(self.arclength_error, error[done].max())
+                        capped += np.count_nonzero(error[done] > self.arclength_tol)
+                    need = size * (error[~done] / self.arclength_tol)**0.25 * 1.1
+                    m[rows[~done]] = np.clip(2**np.ceil(np.log2(need)), 2*size, max_samples_per_segment)
+            pending = np.nonzero(counts == 0)[0]
+        if capped:
+            warnings.warn(f"arc-length table: {capped} segments stopped at {max_samples_per_segment} samples "
+                          f"with error up to {self.arclength_error:.3g}, above arclength_tol={self.arclength_tol:g}")
+
+        # knots shared by neighbouring segments are stored once
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        knot_seg = np.repeat(seg, counts)
+        knot_t = np.empty(offsets[-1])
+        knot_local = np.empty(offsets[-1])
+        knot_speed = np.empty(offsets[-1])
+        for rows, t, local, speed in finished:
+            idx = offsets[rows][:, np.newaxis] + np.arange(len(t) - 1)
+            knot_t[idx] = t[:-1]
+            knot_local[idx] = local[:, :-1]
+            knot_speed[idx] = speed[:, :-1]
+        return counts, knot_seg, knot_t, knot_local, knot_speed
+
+    # knots of segments seg with m intervals each, and the worst midpoint error per segment.
+    # the halves of the intervals are short, so a fixed gauss rule integrates them, at nodes shared by
+    # every segment. its error shows in the sum over the segment, checked against the segment length
+    def _arclength_knots(self, seg, m, order=4):
+        seg = seg[:, np.newaxis]
+        nodes, weights = np.polynomial.legendre.leggauss(order)
+        edges = np.linspace(0, 1, 2*m + 1)
+        half = edges[1] - edges[0]
+        quadrature = self.segment_speed(seg, (edges[:-1, np.newaxis] + half*(nodes + 1)/2).ravel())
+        halves = quadrature.reshape(len(seg), 2*m, order) @ weights * (half/2)
+        speeds = self.segment_speed(seg, edges)
+        t, t_mid = edges[::2], edges[1::2]
+        speed, speed_mid = speeds[:, ::2], speeds[:, 1::2]
+        pieces = halves[:, ::2] + halves[:, 1::2]
+        local = np.concatenate([np.zeros((len(seg), 1)), np.cumsum(pieces, axis=1)], axis=1)
+        s_mid = local[:, :-1] + halves[:, ::2]
+        error_sum = np.abs(local[:, -1] - (self.cumulative_lengths[seg[:, 0] + 1] - self.cumulative_lengths[seg[:, 0]]))
+
+        h = t[1] - t[0]
+        m0, m1 = monotone_slopes(h, pieces, speed[:, :-1], speed[:, 1:])
+        error_s = np.abs(hermite(t[:-1], t[1:], local[:, :-1], local[:, 1:], m0, m1, t_mid) - s_mid)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            m0, m1 = monotone_slopes(pieces, h, 1/speed[:, :-1], 1/speed[:, 1:])
+            t_est = hermite(local[:, :-1], local[:, 1:], t[:-1], t[1:], m0, m1, s_mid)
+        error_u = np.abs(np.nan_to_num(t_est, nan=t_mid) - t_mid) * speed_mid
+
+        error = np.maximum(np.maximum(error_s, error_u).max(axis=1), error_sum)
+        return t, local, speed, error
+
+    def _table_interval(self, values, table):
+        i = np.searchsorted(table, values, side='right') - 1
+        return np.clip(i, 0, len(table) - 2)
+
+    # |B'(t)| of segment seg. seg and t are broadcast against each other
+    def segment_speed(self, seg, t):
+        # gathered once per seg element, so broadcasting many t against one seg stays cheap
+        c = self.speed2_coefs[seg]
+        t = np.asarray(t, dtype=float)
+        speed2 = np.asarray(c[..., 4] * t)
+        for k in range(3, 0, -1):
+            speed2 += c[..., k]
+            speed2 *= t
+        speed2 += c[..., 0]
+        return np.sqrt(np.maximum(speed2, 0, out=speed2), out=speed2)
     
     # reparametrize the whole spline in single parameter, u
     # u is same scale as t: if there are N points and N-1 segments, 0 <= u <= N-1 
-    def coordinate(self, u):
-        u = self.limit_u(u)
-
+    def segment_params(self, u):
+        u = np.asarray(u, dtype=float)
         n_segments = self.N-1
-        if u <= 0:
-            seg = 0
-            t = 0.0
-        elif u >= n_segments:
-            seg = n_segments-1
-            t = 1.0
+        seg = np.clip(np.floor(u).astype(int), 0, n_segments-1)
+        t = np.clip(u - seg, 0.0, 1.0)
+        return seg, t
+
+    def _evaluate(self, coefs, u):
+        u = np.asarray(u, dtype=float)
+        seg, t = self.segment_params(u.ravel())
+        values = polyval_segments(coefs, seg, t)
+        return values.reshape(u.shape + (self.dim,))
+
+    def coordinates(self, u_array):
+        return self._evaluate(self.coefs, u_array)
+
+    def tangents(self, u_array):
+        return self._evaluate(self.dcoefs, u_array)
+
+    def normals(self, u_array):
+        return self._evaluate(self.ddcoefs, u_array)
+
+    def binormals(self, u_array):
+        return np.cross(self.tangents(u_array), self.normals(u_array))
+
+    # stacked (x, y, z) frames, shape (..., 3, 3). frame is "frenet_frame", "up_frame" or "rmf_frame".
+    # rotation minimizing frames only exist as a table, see frame_table
+    def frames(self, u_array, frame="frenet_frame", V_up=np.array([0, 0, 1])):
+        u_array = np.asarray(u_array, dtype=float)
+        if frame == "rmf_frame":
+            return self.frame_table(frame).lookup(u_array)
+
+        z = normalize_many(self.tangents(u_array))
+
+        if frame == "frenet_frame":
+            x = normalize_many(self.binormals(u_array - self.du))
+            y = normalize_many(np.cross(x, z))
+        elif frame == "up_frame":
+            x = normalize_many(np.cross(V_up, z))
+            y = normalize_many(np.cross(z, x))
         else:
-            seg = int(u)
-            t = u-seg
+            raise ValueError(f"unknown frame type: {frame}")
+
+        return np.stack((x, y, z), axis=-2)
+
+    # precomputed frames shared by the rail, the cart and the camera. built on first use
+    def frame_table(self, frame):
+        if frame not in self.frame_tables:
+            if self.cache_dir is None:
+                self.frame_tables[frame] = FrameTable(self, frame)
+            else:
+                self.frame_tables[frame] = self._cached_frame_table(frame)
+        return self.frame_tables[frame]
+
+    def _cached_frame_table(self, frame):
+        path = self.cache_path(frame)
+        if os.path.exists(path):
+            return FrameTable(self, frame, arrays=load_arrays(path))
+        table = FrameTable(self, frame)
+        save_arrays(path, table.arrays())
+        return table
 
-        point = [self.curve_list[d][seg](t) for d in range(self.dim)]
-        return np.array(point)
+    def coordinate(self, u):
+        u = self.limit_u(u)
+        return self.coordinates(u)
 
     def tangent(self, u):
         u = self.limit_u(u)
-
-        n_segments = self.N-1
-        if u <= 0:
-            seg = 0
-            t = 0.0
-        elif u >= n_segments:
-            seg = n_segments-1
-            t = 1.0
-        else:
-            seg = int(u)
-            t = u-seg
-
-        tangent = [self.curve_list[d][seg].deriv()(t) for d in range(self.dim)]
-        return np.array(tangent)
+        return self.tangents(u)
     
     def normal(self, u):
         u = self.limit_u(u)
-
-        n_segments = self.N-1
-        if u <= 0:
-            seg = 0
-            t = 0.0
-        elif u >= n_segments:
-            seg = n_segments-1
-            t = 1.0
-        else:
-            seg = int(u)
-            t = u-seg
-
-        normal = [self.curve_list[d][seg].deriv().deriv()(t) for d in range(self.dim)]
-        return np.array(normal)
+        return self.normals(u)
     
     def binormal(self, u):
         u = self.limit_u(u)
-
-        binormal = np.cross(self.tangent(u), self.normal(u))
-        return np.array(binormal)
+        return self.binormals(u)
     
     # frenet frame with modification. allows smoothing factor du
     def frenet_frame(self, u):
         u = self.limit_u(u)
-
-        z = normalize(self.tangent(u))
-        x = normalize(self.binormal(u-self.du))
-        y = normalize(np.cross(x, z))
-
-        frame = np.vstack((x, y, z))
-        return frame
+        return self.frames(u, frame="frenet_frame")
     
     # frame that keeps y axis towards V_up vector
     def up_frame(self, u, V_up = np.array([0, 0, 1])):
         u = self.limit_u(u)
-
-        z = normalize(self.tangent(u))
-        x = normalize(np.cross(V_up, z))
-        y = normalize(np.cross(z, x))
-
-        frame = np.vstack((x, y, z))
-        return frame
+        return self.frames(u, frame="up_frame", V_up=V_up)
 
     def length(self, u):        
         seg = int(u)
@@ -194,51 +492,314 @@ class NatCubeSpline:
         length = self.cumulative_lengths[seg]
 
         if fraction > 0:
-            ds = self.ds_list[seg]
-            length += integrate(ds, 0, fraction, n_intervals=20)
+            length += float(self.segment_lengths(seg, 0, fraction))
         
         return length
     
-    def inv_length(self, s):
-        u0 = self.umax/2
-        u = u0
-        error = abs(self.length(u0) - s)
-        threshold = 0.01
-        iteration = 0
-        max_iter = 1000
-        
-        while iteration <= max_iter:
-            seg = int(u)
-            current_length = self.length(u)
-            error = s - current_length
-            dlength = - self.ds_list[seg](u)
-
-            # print(f"iter: {iteration}, u: {u}, s(current): {current_length}, error: {error}")
-            if (abs(error) <= threshold) or (dlength == 0): break
-
-            u = u - (s-current_length)/dlength
-            if u >= self.umax or u<= self.umin:
-                u = self.umin
-                break
-
-            iteration += 1
+    # arc length at every u of u_array, from the arc-length table
+    def length_many(self, u_array):
+        u = np.clip(np.asarray(u_array, dtype=float), self.umin, self.umax)
+        seg, t = self.segment_params(u)
+        counts = self.table_counts[seg]
+        i = self.table_offsets[seg] + np.minimum(np.floor(t * counts).astype(int), counts - 1)
+        u0, u1 = self.table_u[i], self.table_u[i+1]
+        s0, s1 = self.table_s[i], self.table_s[i+1]
+        m0, m1 = monotone_slopes(u1 - u0, s1 - s0, self.table_dsdu[i], self.table_dsdu[i+1])
+        return hermite(u0, u1, s0, s1, m0, m1, u)
+
+    # u at every arc length of s_array, from the arc-length table.
+    # closed tracks wrap around, open tracks are clamped to their ends.
+    # polish applies one newton step on the exact segment integral
+    def inv_length_many(self, s_array, polish=False):
+        total = self.cumulative_lengths[-1]
+        s = np.asarray(s_array, dtype=float)
+        s = np.mod(s, total) if self.closed else np.clip(s, 0, total)
+
+        i = self._table_interval(s, self.table_s)
+        u0, u1 = self.table_u[i], self.table_u[i+1]
+        s0, s1 = self.table_s[i], self.table_s[i+1]
+        with np.errstate(divide='ignore'):
+            m0, m1 = monotone_slopes(s1 - s0, u1 - u0, 1/self.table_dsdu[i], 1/self.table_dsdu[i+1])
+        u = hermite(s0, s1, u0, u1, m0, m1, s)
+
+        if polish:
+            seg, t = self.segment_params(u)
+            t_knot = u0 - seg
+            current = s0 + self.segment_lengths(seg, t_knot, t)
+            speed = self.segment_speed(seg, t)
+            step = np.divide(current - s, speed, out=np.zeros_like(u), where=speed > 0)
+            u = np.clip(u - step, self.umin, self.umax)
 
         return u
+
+    def inv_length(self, s, polish=False):
+        return float(self.inv_length_many(s, polish=polish))
     
     def speed(self, u, g=9.8):
-        #u =self.limit_u(u)
-        hmax = self.hmax
-        h = self.coordinate(u)[2]
-        if hmax < h:
-            Warning("h bigger than hmax. simulation error")
-        speed = sqrt(2*g*(hmax-h))
-        return speed
+        seg = min(max(int(u // 1), 0), self.N-2)
+        return self.speed_at(seg, min(max(u - seg, 0.0), 1.0), g)
+
+    # speed at t of segment seg from energy conservation, on python floats so a simulation
+    # step costs no numpy calls. the height polynomials are cached as lists
+    def speed_at(self, seg, t, g=9.8):
+        if self._heights is None:
+            self._heights = self.coefs[:, :, 2].tolist()
+        c0, c1, c2, c3 = self._heights[seg]
+        h = ((c3*t + c2)*t + c1)*t + c0
+        return sqrt(2*g*max(self.hmax - h, 0.0))
+
+    # speed at every u of u_array, same energy physics as speed
+    def speeds(self, u_array, g=9.8):
+        h = self.coordinates(u_array)[..., 2]
+        return np.sqrt(2*g*np.maximum(self.hmax - h, 0))
+
+    # third derivative, constant inside each segment
+    def third_derivatives(self, u_array):
+        u = np.asarray(u_array, dtype=float)
+        seg, _ = self.segment_params(u.ravel())
+        return self.ddcoefs[seg, 1].reshape(u.shape + (self.dim,))
     
-    def set_hmax(self, div):
-        du = self.umax/div
-
-        for i in range(div):
-            z = self.coordinate(i*du)[2]
-            if z > self.hmax:
-                self.hmax = z
-        self.hmax +=0.02
+    # exact highest point from the segment boxes. margin keeps the cart from stalling there
+    def set_hmax(self, margin=0.02):
+        self.hmargin = margin
+        self.hmax = max(self.hmax, self.bboxes[:, 1, 2].max())
+        self.hmax += margin
+
+    # Move pass point i to new_xyz and patch everything built from it in place.
+    # A change of rhs in a few rows of the control point system decays by about 0.27 per row
+    # (the root of the 1-4-1 stencil), so only `window` rows around it are solved again, which
+    # is exact to ~1e-18 of the change for the default window. Only the segments that moved are
+    # integrated and tabulated again, cumulative_lengths is shifted from the first of them on.
+    # returns the sorted (u0, u1) ranges of the track that changed, for the rail to rebuild.
+    # SplineCursors on this spline should reset or jump afterwards
+    def update_point(self, i, new_xyz, window=32):
+        n = self.N - 1
+        i = int(i) % self.N
+        # the first and last points of a closed track are the same point
+        points = [0, n] if self.closed and i in (0, n) else [i]
+
+        # rows of the system that read the moved points
+        rows = np.array([p + k for p in points for k in (-1, 0)])
+        rows = np.unique(rows % n) if self.closed else np.unique(rows[(rows >= 0) & (rows < n)])
+        old_rhs = self._control_rhs(rows)
+        self.pass_points[points] = new_xyz
+        delta = self._control_rhs(rows) - old_rhs
+        moved = np.any(delta != 0, axis=1)
+        rows, delta = rows[moved], delta[moved]
+        if len(rows) == 0:
+            return []
+        lower, diag, upper = self._control_matrix()
+
+        # rows to solve again, wrapping around closed tracks
+        if self.closed:
+            lo, hi = rows.min(), rows.max()
+            if hi - lo > n // 2:
+                # the changed rows straddle the seam: walk from the last one over the seam
+                lo, hi = rows[rows > n // 2].min(), rows[rows <= n // 2].max() + n
+            lo, hi = lo - window, hi + window
+            if hi - lo + 1 >= n:
+                w = np.arange(n)
+                rhs = np.zeros((n, self.dim))
+                rhs[rows] = delta
+                change = solve_cyclic_tridiagonal(lower, diag, upper, rhs)
+            else:
+                w = np.arange(lo, hi + 1) % n
+                change = solve_tridiagonal(lower[w], diag[w], upper[w], self._window_rhs(w, rows, delta))
+        else:
+            w = np.arange(max(rows.min() - window, 0), min(rows.max() + window, n - 1) + 1)
+            change = solve_tridiagonal(lower[w], diag[w], upper[w], self._window_rhs(w, rows, delta))
+        self.control_points[w, 0] += change
+
+        # a segment moves with its first control point, the next segment's first control
+        # point (its second control point) and its end points
+        seg = np.concatenate([w, w - 1, [p - 1 for p in points], [p for p in points]])
+        seg = np.unique(seg % n) if self.closed else np.unique(seg[(seg >= 0) & (seg < n)])
+        self._set_second_control_points(seg)
+        self._set_segment_polynomials(seg)
+        self.bboxes[seg] = self._bounding_boxes(seg)
+
+        lengths, error = integrate_segments(self.segment_speed, seg, 0, 1, tol=self.integration_tol)
+        segment_lengths = np.diff(self.cumulative_lengths)
+        segment_lengths[seg] = lengths
+        self.cumulative_lengths[seg[0]+1:] = self.cumulative_lengths[seg[0]] + np.cumsum(segment_lengths[seg[0]:])
+        self.segment_length_errors[seg] = error
+        self.length_error = self.segment_length_errors.sum()
+        self._update_arclength_table(seg)
+
+        self.hmax = self.bboxes[:, 1, 2].max() + self.hmargin
+        self.segment_tree = None
+        self._heights = None
+        if self.cache_dir is not None:
+            # frame tables built or loaded from now on belong to the edited track
+            self.cache_key = track_key(self.pass_points, self.arclength_tol, self.integration_tol)
+
+        ranges = _segment_ranges(seg)
+        for table in self.frame_tables.values():
+            table.update(ranges)
+        return ranges
+
+    # right hand side over the consecutive (mod n) rows w, delta at rows and 0 elsewhere
+    def _window_rhs(self, w, rows, delta):
+        rhs = np.zeros((len(w), self.dim))
+        rhs[(rows - w[0]) % (self.N - 1)] = delta
+        return rhs
+
+    # replace the knots of the sorted segments seg, keeping every other segment's knots
+    # segments start at the knot count they had, so a small move usually keeps it
+    def _update_arclength_table(self, seg):
+        counts, knot_seg, knot_t, knot_local, knot_speed = self._arclength_rows(seg, self.table_counts[seg])
+        offsets = self.table_offsets
+        if np.array_equal(counts, self.table_counts[seg]):
+            # the usual small move: the knots stay where they are, only s from the first edited
+            # segment on changes
+            idx = np.repeat(offsets[seg] - np.concatenate([[0], np.cumsum(counts)[:-1]]), counts) + np.arange(counts.sum())
+            self.table_t[idx] = knot_t
+            self.table_local[idx] = knot_local
+            self.table_dsdu[idx] = knot_speed
+            if seg[-1] == self.N-2:
+                self.table_dsdu[-1] = self.segment_speed(self.N-2, 1.0)
+            self.table_local[-1] = self.cumulative_lengths[-1] - self.cumulative_lengths[-2]
+            # knots of the edited segments (and any between them) from their new s, later knots shifted
+            first, last = offsets[seg[0]], offsets[seg[-1] + 1]
+            shift = self.cumulative_lengths[seg[-1] + 1] - self.table_s[last]
+            self.table_s[first:last] = self.cumulative_lengths[self.table_seg[first:last]] + self.table_local[first:last]
+            self.table_s[last:] += shift
+            self.table_s[-1] = self.cumulative_lengths[-1]
+            return
+        keep = np.ones(len(self.table_seg), dtype=bool)
+        keep[np.repeat(offsets[seg], self.table_counts[seg]) + np.arange(self.table_counts[seg].sum())
+             - np.repeat(np.cumsum(self.table_counts[seg]) - self.table_counts[seg], self.table_counts[seg])] = False
+        # new knots go in front of the first kept knot of a later segment
+        at = np.searchsorted(np.nonzero(keep)[0], offsets[seg])
+        at = np.repeat(at, counts)
+
+        self.table_counts[seg] = counts
+        self.table_seg = np.insert(self.table_seg[keep], at, knot_seg)
+        self.table_t = np.insert(self.table_t[keep], at, knot_t)
+        self.table_local = np.insert(self.table_local[keep], at, knot_local)
+        self.table_dsdu = np.insert(self.table_dsdu[keep], at, knot_speed)
+        if seg[-1] == self.N-2:
+            self.table_dsdu[-1] = self.segment_speed(self.N-2, 1.0)
+        self._finish_arclength_table()
+
+
+# sorted segment indices -> list of (u0, u1) for every run of consecutive segments
+def _segment_ranges(seg):
+    breaks = np.nonzero(np.diff(seg) > 1)[0]
+    starts = np.concatenate([[seg[0]], seg[breaks + 1]])
+    ends = np.concatenate([seg[breaks], [seg[-1]]]) + 1
+    return [(float(a), float(b)) for a, b in zip(starts, ends)]
+
+
+GL3_NODE = sqrt(3/5)
+
+# walks along a spline by arc length. Keeps the current segment, local t and s so that
+# a small step ds is a warm-started newton solve inside (or next to) the current segment
+class SplineCursor:
+    def __init__(self, spline, s=0.0, tol=1e-9, max_iter=8, max_hops=8):
+        self.spline = spline
+        self.s0 = s
+        self.tol = tol
+        self.max_iter = max_iter
+        self.max_hops = max_hops  # farther jumps fall back to the arc-length table
+        self.laps = 0
+        self._coef_seg = None
+        self.reset(s)
+
+    @property
+    def u(self):
+        return self.seg + self.t
+
+    def reset(self, s=None):
+        s = self.s0 if s is None else s
+        self.laps = 0
+        self.jump(s)
+
+    # place the cursor at absolute arc length s from the table
+    def jump(self, s):
+        spline = self.spline
+        total = spline.cumulative_lengths[-1]
+        if spline.closed:
+            self.laps += int(s // total)
+            s = s % total
+        else:
+            s = min(max(s, 0.0), total)
+        u = spline.inv_length(s, polish=True)
+        seg, t = spline.segment_params(u)
+        self.seg, self.t, self.s = int(seg), float(t), float(s)
+
+    def advance(self, ds):
+        spline = self.spline
+        cum = spline.cumulative_lengths
+        n_segments = spline.N-1
+        total = cum[-1]
+        target = self.s + ds
+
+        if spline.closed:
+            if target >= total or target < 0:
+                self.laps += int(target // total)
+                target = target % total
+        else:
+            target = min(max(target, 0.0), total)
+
+        # hop to the segment that holds the target
+        seg = self.seg
+        hops = 0
+        while hops <= self.max_hops and not (cum[seg] <= target <= cum[seg+1]):
+            if target > cum[seg+1]:
+                seg = seg + 1 if seg < n_segments-1 else 0
+            else:
+                seg = seg - 1 if seg > 0 else n_segments-1
+            hops += 1
+        if hops > self.max_hops:
+            self.jump(target)
+            return self.u
+
+        if seg != self.seg:
+            # restart from whichever end of the new segment is closer
+            if target - cum[seg] <= cum[seg+1] - target:
+                self.seg, self.t, self.s = seg, 0.0, float(cum[seg])
+            else:
+                self.seg, self.t, self.s = seg, 1.0, float(cum[seg+1])
+        self._solve(target)
+        return self.u
+
+    # newton on s(t) = s_cur + integral of |B'| from t_cur, inside the current segment.
+    # the segment's speed quartic is cached as python floats so a tick costs no numpy calls
+    def _solve(self, target):
+        seg, t, s = self.seg, self.t, self.s
+        if seg != self._coef_seg:
+            self._coef = self.spline.speed2_coefs[seg].tolist()
+            self._coef_seg = seg
+
+        for _ in range(self.max_iter):
+            error = target - s
+            if abs(error) <= self.tol:
+                break
+            speed = self._speed(t)
+            if speed == 0:
+                break
+            t_new = min(max(t + error/speed, 0.0), 1.0)
+            s += self._integral(t, t_new)
+            t = t_new
+        self.t, self.s = t, target
+
+    def _speed(self, t):
+        c0, c1, c2, c3, c4 = self._coef
+        return sqrt(max((((c4*t + c3)*t + c2)*t + c1)*t + c0, 0.0))
+
+    # 3-point gauss-legendre, split into pieces no longer than 1/16 in t
+    def _integral(self, t0, t1):
+        n = 1 + int(16*abs(t1 - t0))
+        h = (t1 - t0) / n
+        total = 0.0
+        for k in range(n):
+            mid = t0 + (k + 0.5)*h
+            total += (5*self._speed(mid - GL3_NODE*h/2) + 8*self._speed(mid) + 5*self._speed(mid + GL3_NODE*h/2)) / 9
+        return total * h / 2
+
+    def position(self):
+        return self.spline.coordinate(self.u)
+
+    def frame(self, frame="frenet_frame"):
+        return self.spline.frames(self.u, frame)
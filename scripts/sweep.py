@@ -0,0 +1,101 @@
+# Parameter sweep over track designs, run in parallel with a process pool.
+#
+#   python -m scripts.sweep --heights 0.8 1 1.2 --gravity 9.8 1.62 --frames up_frame rmf_frame --output sweep.csv
+#
+# Every design is a variant of one track: heights (z of the passing points) scaled, a frame type and a
+# gravity. Workers build the spline, ride it headless and return one summary row. The frame type sets
+# the cart axes the lateral and vertical g-loads are measured in.
+import argparse
+import itertools
+import os
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from scripts.spline import NatCubeSpline
+from scripts.simulate import simulate
+from scripts.analytics import curvature, ride_profile
+from scripts.frames import FRAME_TYPES
+from scripts.loader import load_track, DEFAULT_TRACK, TRACK_HELP
+
+RESULT = np.dtype([
+    ("design", "<i8"),
+    ("height_scale", "<f8"),
+    ("frame", "U16"),
+    ("gravity", "<f8"),
+    ("length", "<f8"),
+    ("lap_time", "<f8"),
+    ("max_speed", "<f8"),
+    ("peak_curvature", "<f8"),
+    ("peak_lateral_g", "<f8"),
+    ("peak_vertical_g", "<f8"),
+])
+
+# set once per worker by the pool initializer, so the track is not sent with every design
+_track = None
+
+
+def _init_worker(points):
+    global _track
+    _track = np.asarray(points, dtype=float)
+
+
+def make_designs(height_scales=(1.0,), frames=("up_frame",), gravities=(9.8,)):
+    return [dict(design=i, height_scale=h, frame=fr, gravity=g)
+            for i, (h, fr, g) in enumerate(itertools.product(height_scales, frames, gravities))]
+
+
+# build and ride one design. the ride lasts until the first lap is done (or max_duration)
+def evaluate_design(design, points=None, dt=1e-3, max_duration=600.0, curvature_samples=64):
+    points = np.array(_track if points is None else points, dtype=float)
+    points[:, 2] *= design["height_scale"]
+    spline = NatCubeSpline(points)
+
+    ride = simulate(spline, dt, max_duration, g=design["gravity"], frame=None, stop_after_lap=True)
+    lap_time = ride["t"][-1] if ride["t"][-1] < max_duration - dt/2 else np.nan
+
+    u = np.linspace(spline.umin, spline.umax, (spline.N-1)*curvature_samples + 1)
+    kappa = curvature(spline, u)
+    profile = ride_profile(spline, design["frame"], g=design["gravity"])
+
+    return (design["design"], design["height_scale"], design["frame"], design["gravity"],
+            spline.cumulative_lengths[-1], lap_time, ride["speed"].max(), kappa.max(),
+            np.abs(profile["lateral_g"]).max(), np.abs(profile["vertical_g"]).max())
+
+
+# evaluate all designs on a process pool, results as one structured array in design order.
+# designs go out in chunks so each worker process (and its numpy import) serves many of them
+def run_sweep(designs, points=DEFAULT_TRACK, workers=None, chunksize=None):
+    workers = workers or os.cpu_count() or 1
+    if chunksize is None:
+        chunksize = max(1, len(designs) // (4*workers))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(points,)) as executor:
+        rows = list(executor.map(evaluate_design, designs, chunksize=chunksize))
+    return np.array(rows, dtype=RESULT)
+
+
+def save_table(path, results):
+    header = ",".join(RESULT.names)
+    np.savetxt(path, results, fmt=["%d", "%g", "%s", "%g", "%.6f", "%.6f", "%.6f", "%.6f", "%.6f", "%.6f"],
+               delimiter=",", header=header, comments="")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate many variants of a track in parallel")
+    parser.add_argument("--track", help=TRACK_HELP)
+    parser.add_argument("--heights", type=float, nargs="+", default=[1.0], help="scale factors for z")
+    parser.add_argument("--frames", choices=FRAME_TYPES, nargs="+", default=["up_frame"])
+    parser.add_argument("--gravity", type=float, nargs="+", default=[9.8])
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default="sweep.csv")
+    args = parser.parse_args(argv)
+
+    points = DEFAULT_TRACK if args.track is None else load_track(args.track)
+    designs = make_designs(args.heights, args.frames, args.gravity)
+    start = time.perf_counter()
+    results = run_sweep(designs, points, workers=args.workers)
+    save_table(args.output, results)
+    print(f"{len(designs)} designs in {time.perf_counter() - start:.2f}s -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
 import numpy as np
-import sympy as sp
-from pyglet.math import Mat4
+from typing import TYPE_CHECKING
+
+# only for annotations, so the numeric modules load without pyglet (headless runs)
+if TYPE_CHECKING:
+	from pyglet.math import Mat4
 
 class TimeCounter:
 	def __init__(self, t0):
@@ -34,29 +37,154 @@ def normalize(u):
 		return u
 	return u / norm
 
+# row-wise normalize along the last axis. zero vectors are returned unchanged
+def normalize_many(u):
+    norm = np.linalg.norm(u, axis=-1, keepdims=True)
+    return u / np.where(norm == 0, 1, norm)
+
+
+# Batched adaptive Gauss-Legendre quadrature of f(seg, t) over [t0, t1] for every element of
+# the broadcast (seg, t0, t1) arrays in one call. Each interval is compared against the sum
+# over its two halves; only intervals whose difference exceeds their share of tol are split
+# again. tol is relative to the integral: an interval gets tol times the size of the integral it
+# is part of, halved with every split. the first pass evaluates the whole intervals and their
+# halves in one call of f, and at order 10 it is the only one for most smooth integrands.
+# Returns the integrals and the summed error estimates, both shaped like the input.
+def integrate_segments(f, seg, t0, t1, tol=1e-10, order=10, max_depth=30):
+    seg, t0, t1 = np.broadcast_arrays(seg, np.asarray(t0, dtype=float), np.asarray(t1, dtype=float))
+    shape = t0.shape
+    nodes, weights = np.polynomial.legendre.leggauss(order)
+    # nodes and weights of the whole interval [0, 1], then of its two halves
+    nodes = np.concatenate([nodes + 1, nodes/2 + 0.5, nodes/2 + 1.5]) / 2
+    weights = np.concatenate([weights, weights/2, weights/2]) / 2
+
+    size = t0.size
+    owner = np.arange(size)
+    seg, a, b = seg.ravel(), t0.ravel(), t1.ravel()
+    values = f(seg[:, np.newaxis], a[:, np.newaxis] + (b - a)[:, np.newaxis]*nodes) * weights
+    whole = values[:, :order].sum(axis=1) * (b - a)
+    local_tol = tol * np.abs(whole)
+    result = np.zeros(size)
+    error = np.zeros(size)
+
+    for depth in range(max_depth + 1):
+        if depth > 0:
+            # halves of the intervals split last round; whole is their estimate from that round
+            values = f(seg[:, np.newaxis], a[:, np.newaxis] + (b - a)[:, np.newaxis]*nodes[order:]) * weights[order:]
+        else:
+            values = values[:, order:]
+        left = values[:, :order].sum(axis=1) * (b - a)
+        right = values[:, order:].sum(axis=1) * (b - a)
+        diff = np.abs(left + right - whole)
+        done = (diff <= local_tol) | (depth == max_depth)
+        result += np.bincount(owner[done], weights=(left + right)[done], minlength=size)
+        error += np.bincount(owner[done], weights=diff[done], minlength=size)
+
+        split = ~done
+        if not np.any(split):
+            break
+        mid = (a + b) / 2
+        owner = np.concatenate([owner[split], owner[split]])
+        seg = np.concatenate([seg[split], seg[split]])
+        a, b = np.concatenate([a[split], mid[split]]), np.concatenate([mid[split], b[split]])
+        whole = np.concatenate([left[split], right[split]])
+        local_tol = np.concatenate([local_tol[split], local_tol[split]]) / 2
+
+    return result.reshape(shape), error.reshape(shape)
+
+# Fritsch-Carlson limiting: keeps the cubic hermite interpolant monotone between knots
+def monotone_slopes(dx, dy, m0, m1):
+    secant = dy / dx
+    m0 = np.where(secant == 0, 0, np.clip(m0, 0, 3*secant))
+    m1 = np.where(secant == 0, 0, np.clip(m1, 0, 3*secant))
+    return m0, m1
+
+# cubic hermite interpolation on [x0, x1], all arguments broadcast
+def hermite(x0, x1, y0, y1, m0, m1, x):
+    h = x1 - x0
+    t = (x - x0) / h
+    t2 = t*t
+    t3 = t2*t
+    return ((2*t3 - 3*t2 + 1) * y0 + (t3 - 2*t2 + t) * h * m0
+            + (-2*t3 + 3*t2) * y1 + (t3 - t2) * h * m1)
+
+def solve_tridiagonal(lower, diag, upper, rhs):
+    """Cyclic reduction for a tridiagonal system with k right-hand sides.
 
-def integrate(P, u1, u2, n_intervals=10):
-    u1 = float(u1)
-    u2 = float(u2)
-    n_samples = 2 * n_intervals + 1
-    x_vals = np.linspace(u1, u2, n_samples)
-    y_vals = P(x_vals)  # Fast vectorized evaluation
+    lower[i] multiplies x[i-1] and upper[i] multiplies x[i+1] in row i (lower[0] and
+    upper[-1] are ignored). rhs has shape (n, k). Every step eliminates the even rows from
+    the odd ones, for all rows and columns at once as (n, k) arrays, so there are log2(n)
+    numpy steps and O(n*k) work. Like the Thomas algorithm it does not pivot, which the
+    diagonally dominant spline systems do not need.
+    """
+    rhs = np.asarray(rhs, dtype=float)
+    n = len(diag)
+    # rows x = 0 up to 2^j - 1 rows, so that every odd row has a row before and after it
+    size = 2**int(np.ceil(np.log2(n + 1))) - 1
+    a, b, c = np.zeros(size), np.ones(size), np.zeros(size)
+    a[1:n], b[:n], c[:n-1] = lower[1:], diag, upper[:-1]
+    d = np.zeros((size, rhs.size // n))
+    d[:n] = rhs.reshape(n, -1)
 
-    h = (u2 - u1) / (n_samples - 1)
+    levels = []
+    while len(b) > 1:
+        levels.append((a, b, c, d))
+        alpha = -a[1::2] / b[0:-1:2]
+        gamma = -c[1::2] / b[2::2]
+        d = d[1::2] + alpha[:, None]*d[0:-1:2] + gamma[:, None]*d[2::2]
+        b = b[1::2] + alpha*c[0:-1:2] + gamma*a[2::2]
+        a, c = alpha*a[0:-1:2], gamma*c[2::2]
 
-    result = h/3 * (y_vals[0]
-                    + 2 * np.sum(y_vals[2:-1:2])
-                    + 4 * np.sum(y_vals[1::2])
-                    + y_vals[-1])
-    
-    return result
+    # substitution, the even rows from the odd rows around them
+    x = d / b[:, None]
+    for a, b, c, d in reversed(levels):
+        around = np.zeros((len(x) + 2, x.shape[1]))
+        around[1:-1] = x
+        full = np.empty_like(d)
+        full[1::2] = x
+        full[0::2] = (d[0::2] - a[0::2, None]*around[:-1] - c[0::2, None]*around[1:]) / b[0::2, None]
+        x = full
 
-def np2sp(poly_np, symbol = 'x'):
-    x = sp.symbols(symbol)
-    expr = sum(coef * x**i for i, coef in enumerate(poly_np.coef))
-    return expr
+    return x[:n].reshape(rhs.shape)
 
-def centerNvector(cls: type[Mat4], center, vector, up) -> Mat4:
+def solve_cyclic_tridiagonal(lower, diag, upper, rhs):
+    """Tridiagonal system with corner entries, solved with Sherman-Morrison.
+
+    Same layout as solve_tridiagonal, except lower[0] is the entry A[0, n-1] and
+    upper[-1] is the entry A[n-1, 0]. The correction vector is appended as an extra
+    right-hand side so it shares the factorization.
+    """
+    n = len(diag)
+    rhs = np.asarray(rhs, dtype=float)
+    if n < 3:
+        A = np.diag(np.asarray(diag, dtype=float))
+        for i in range(n):
+            A[i][(i - 1) % n] += lower[i]
+            A[i][(i + 1) % n] += upper[i]
+        return np.linalg.solve(A, rhs)
+
+    alpha = float(upper[-1])  # A[n-1, 0]
+    beta = float(lower[0])    # A[0, n-1]
+    gamma = -float(diag[0])
+
+    diag_mod = np.array(diag, dtype=float)
+    diag_mod[0] -= gamma
+    diag_mod[-1] -= alpha * beta / gamma
+
+    b = rhs.reshape(n, -1)
+    corr = np.zeros((n, 1))
+    corr[0] = gamma
+    corr[-1] = alpha
+    yz = solve_tridiagonal(lower, diag_mod, upper, np.hstack([b, corr]))
+    y, z = yz[:, :-1], yz[:, -1:]
+
+    # v = (1, 0, ..., 0, beta/gamma)
+    vy = y[0] + beta / gamma * y[-1]
+    vz = z[0] + beta / gamma * z[-1]
+    x = y - z * (vy / (1 + vz))
+    return x.reshape(rhs.shape)
+
+def centerNvector(cls: "type[Mat4]", center, vector, up) -> "Mat4":
     """Create a Mat4 from center of geometry and vector for direction. both numpy array"""
     z = normalize(vector)
     up = normalize(up)
@@ -66,4 +194,31 @@ def centerNvector(cls: type[Mat4], center, vector, up) -> Mat4:
     return cls(x[0], x[1], x[2], 0,  
                y[0], y[1], y[2], 0,  
                z[0], z[1], z[2], 0,  
-               center[0], center[1], center[2], 1)
\ No newline at end of file
+               center[0], center[1], center[2], 1)
+
+# centerNvector for many frames at once: (K x 4 x 4) matrices with columns x, y, z, center
+def frame_matrices(centers, vectors, ups):
+    z = normalize_many(np.asarray(vectors, dtype=float))
+    x = normalize_many(np.cross(ups, z))
+    y = normalize_many(np.cross(z, x))
+    matrices = np.zeros((len(z), 4, 4))
+    matrices[:, :3, 0] = x
+    matrices[:, :3, 1] = y
+    matrices[:, :3, 2] = z
+    matrices[:, :3, 3] = centers
+    matrices[:, 3, 3] = 1
+    return matrices
+
+# the 6 clip planes (left, right, bottom, top, near, far) of a projection @ view matrix, as rows
+# (a, b, c, d) with a*x + b*y + c*z + d >= 0 on the inside. matrix is column major, like Mat4
+def frustum_planes(matrix):
+    m = np.asarray(matrix, dtype=float).reshape(4, 4).T
+    planes = np.array([m[3] + m[0], m[3] - m[0], m[3] + m[1], m[3] - m[1], m[3] + m[2], m[3] - m[2]])
+    return planes / np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+
+# which axis aligned boxes (K x 2 x 3 lower and upper corners) are at least partly inside the planes.
+# conservative: a box is out only when it is fully behind one plane
+def boxes_in_frustum(planes, boxes):
+    # the corner of each box farthest along each plane normal
+    corners = np.where(planes[:, np.newaxis, :3] >= 0, boxes[np.newaxis, :, 1], boxes[np.newaxis, :, 0])
+    return np.all(np.sum(corners * planes[:, np.newaxis, :3], axis=-1) + planes[:, 3:4] >= 0, axis=0)
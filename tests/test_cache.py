@@ -0,0 +1,55 @@
+import os
+import numpy as np
+from scripts.cache import save_arrays, load_arrays
+from scripts.spline import NatCubeSpline, CACHED_ARRAYS
+from scripts.loader import DEFAULT_TRACK
+
+
+def test_arrays_round_trip(tmp_path):
+    path = os.path.join(tmp_path, "arrays.npz")
+    arrays = {"floats": np.arange(12.0).reshape(3, 4), "fortran": np.asfortranarray(np.arange(6).reshape(2, 3)),
+              "empty": np.zeros((0, 3)), "scalar": np.float64(2.5), "flag": True}
+    save_arrays(path, arrays)
+    loaded = load_arrays(path)
+    assert isinstance(loaded["floats"], np.memmap)
+    for name, array in arrays.items():
+        assert np.array_equal(loaded[name], array)
+        assert np.shape(loaded[name]) == np.shape(array)
+
+
+def test_mapped_arrays_are_copy_on_write(tmp_path):
+    path = os.path.join(tmp_path, "arrays.npz")
+    save_arrays(path, {"values": np.zeros(100)})
+    loaded = load_arrays(path)["values"]
+    loaded[10:20] = 1.0
+    assert loaded.sum() == 10
+    assert not load_arrays(path)["values"].any()
+
+
+def test_cached_spline_round_trip_and_edit(tmp_path):
+    points = np.asarray(DEFAULT_TRACK, dtype=float)
+    built = NatCubeSpline(points, cache_dir=str(tmp_path))
+    built.frame_table("rmf_frame")
+    cached = NatCubeSpline(points, cache_dir=str(tmp_path))
+    table = cached.frame_table("rmf_frame")
+    for name in CACHED_ARRAYS:
+        assert np.array_equal(getattr(cached, name), getattr(built, name)), name
+    assert isinstance(cached.table_s, np.memmap) and isinstance(table.quats, np.memmap)
+
+    # editing a loaded track changes the mapped arrays in memory, the same as editing a built one
+    plain = NatCubeSpline(points)
+    plain.frame_table("rmf_frame")
+    moved = points[4] + [0.5, -0.3, 0.2]
+    cached.update_point(4, moved)
+    plain.update_point(4, moved)
+    for name in CACHED_ARRAYS:
+        assert np.array_equal(getattr(cached, name), getattr(plain, name)), name
+    u = np.linspace(0, cached.umax, 1001)
+    assert np.allclose(table.lookup(u), plain.frame_table("rmf_frame").lookup(u))
+
+    # the files still hold the track as it was, and the edited track has a key of its own
+    assert cached.cache_key != built.cache_key
+    again = NatCubeSpline(points, cache_dir=str(tmp_path))
+    for name in CACHED_ARRAYS:
+        assert np.array_equal(getattr(again, name), getattr(built, name)), name
+    assert not os.path.exists(cached.cache_path())
@@ -0,0 +1,36 @@
+import numpy as np
+from scripts.spline import NatCubeSpline
+from scripts.loader import DEFAULT_TRACK
+
+
+# distances to a dense sampling of every segment
+def brute_force(spline, queries, samples_per_segment=2000):
+    u = np.linspace(0, spline.umax, (spline.N - 1)*samples_per_segment + 1)
+    samples = spline.coordinates(u)
+    distance = np.linalg.norm(queries[:, None] - samples[None], axis=-1)
+    return u[distance.argmin(axis=1)], distance.min(axis=1)
+
+
+def test_closest_points_match_brute_force():
+    rng = np.random.default_rng(3)
+    spline = NatCubeSpline(np.asarray(DEFAULT_TRACK, dtype=float))
+    # points near the track and points all around it
+    near = spline.coordinates(rng.uniform(0, spline.umax, 100)) + rng.normal(0, 0.2, (100, 3))
+    queries = np.concatenate([near, rng.uniform(-4, 8, (100, 3))])
+
+    u, points, distance = spline.closest_points(queries)
+    _, expected = brute_force(spline, queries)
+    assert np.allclose(points, spline.coordinates(u))
+    assert np.allclose(distance, np.linalg.norm(queries - points, axis=-1))
+    # never farther than the samples, and the samples are at most a hair from the true curve
+    assert np.all(distance <= expected + 1e-12)
+    assert np.all(expected - distance < 1e-5)
+
+
+def test_closest_points_on_the_track():
+    spline = NatCubeSpline(np.asarray(DEFAULT_TRACK[:-1], dtype=float))
+    u = np.linspace(0, spline.umax, 57)
+    found, _, distance = spline.closest_points(spline.coordinates(u).reshape(3, 19, 3))
+    assert found.shape == distance.shape == (3, 19)
+    assert np.allclose(distance, 0, atol=1e-9)
+    assert np.allclose(found.ravel(), u, atol=1e-6)
@@ -0,0 +1,53 @@
+import numpy as np
+from scripts.spline import NatCubeSpline
+from scripts.loader import DEFAULT_TRACK
+from scripts.utils import normalize_many
+
+
+# y carried sample by sample by the double reflection method (Wang et al. 2008), on a grid much
+# denser than the frame table
+def dense_rmf(points, tangents, y0):
+    y = np.empty_like(points)
+    y[0] = y0
+    for i in range(len(points) - 1):
+        v1 = points[i+1] - points[i]
+        c1 = v1 @ v1
+        yL = y[i] - 2/c1*(v1 @ y[i])*v1
+        tL = tangents[i] - 2/c1*(v1 @ tangents[i])*v1
+        v2 = tangents[i+1] - tL
+        c2 = v2 @ v2
+        y[i+1] = yL - 2/c2*(v2 @ yL)*v2
+    return y
+
+
+def test_rmf_lookup_matches_dense_double_reflection():
+    spline = NatCubeSpline(np.asarray(DEFAULT_TRACK[:-1], dtype=float))
+    table = spline.frame_table("rmf_frame")
+    u = np.linspace(0, spline.umax, (spline.N - 1)*512 + 1)
+    tangents = normalize_many(spline.tangents(u))
+    frames = table.lookup(u)
+
+    y = dense_rmf(spline.coordinates(u), tangents, frames[0, 1])
+    # slerp between table samples is off by a few milliradians at most
+    angle = np.arccos(np.clip(np.einsum('ij,ij->i', frames[:, 1], y), -1, 1))
+    assert angle.max() < 5e-3
+    # a right handed frame along the tangent
+    assert np.allclose(frames[:, 2], tangents, atol=5e-3)
+    assert np.allclose(np.cross(frames[:, 1], frames[:, 2]), frames[:, 0], atol=1e-9)
+
+
+def test_rmf_closes_on_a_loop():
+    spline = NatCubeSpline(np.asarray(DEFAULT_TRACK, dtype=float))
+    first, last = spline.frame_table("rmf_frame").lookup([spline.umin, spline.umax])
+    assert np.allclose(first, last, atol=1e-9)
+
+
+def test_slerp_lookup_between_samples():
+    spline = NatCubeSpline(np.asarray(DEFAULT_TRACK, dtype=float))
+    for frame in ("frenet_frame", "up_frame", "rmf_frame"):
+        table = spline.frame_table(frame)
+        # at the samples the table gives back its own frames, between them unit quaternions
+        assert np.allclose(table.lookup_quat(table.u), table.quats)
+        u = (table.u[:-1] + table.u[1:])/2
+        assert np.allclose(np.linalg.norm(table.lookup_quat(u), axis=-1), 1)
+        assert np.allclose(np.linalg.det(table.lookup(u)), -1 if table.mirror else 1)
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from scripts.loader import load_track
+
+POINTS = np.array([[0, 0, 0], [1, 2, 3], [4.5, -1, 2e-3]])
+
+
+def write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+@pytest.mark.parametrize("text", [
+    "x,y,z\n0,0,0\n1,2,3\n4.5,-1,2e-3\n",
+    "x y z\n0 0 0\n1 2 3\n4.5 -1 2e-3\n",     # header without commas
+    "x y z\n0,0,0\n1,2,3\n4.5,-1,2e-3",       # whitespace header over csv rows, no final line break
+    "0,0,0\n\n1,2,3\r\n\n\n4.5,-1,2e-3\n\n",  # blank lines and windows line breaks
+    "\n0 0 0\n1\t2  3\n 4.5, -1, 2e-3\n",     # blank first line, mixed separators
+    "x,y,z,\n0,0,0,\n1,2,3,\n4.5,-1,2e-3,\n", # trailing commas
+])
+def test_text_tracks(tmp_path, text):
+    assert np.array_equal(load_track(write(tmp_path, "track.csv", text)), POINTS)
+
+
+def test_text_track_in_chunks(tmp_path):
+    points = np.random.default_rng(0).uniform(-10, 10, (1000, 3))
+    path = write(tmp_path, "track.csv", "x,y,z\n" + "\n".join(",".join(repr(float(v)) for v in p) for p in points))
+    assert np.array_equal(load_track(path, chunk_size=100), points)
+
+
+@pytest.mark.parametrize("text, message", [
+    ("x,y,z\n", "no points"),
+    ("x y z\n\n\n", "no points"),
+    ("", "no points"),
+    ("0,0,0\n", "at least 2 points"),
+    ("0,0,0\n1,2\n3,4,5\n", "line 2 has 2 values"),
+    ("x,y,z\n0,0,0\n1,2,3,4\n", "line 3 has 4 values"),
+    ("0,0,0\n1,2,3\n4,five,6\n", "line 3 has values that are not numbers"),
+    ("0,0,0\n1,2,3\n1,2,3\n", "points 1 and 2 are the same"),
+])
+def test_bad_text_tracks(tmp_path, text, message):
+    with pytest.raises(ValueError, match=message):
+        load_track(write(tmp_path, "track.csv", text))
+
+
+def test_binary_tracks(tmp_path):
+    np.save(tmp_path / "track.npy", POINTS)
+    POINTS.astype("<f4").tofile(tmp_path / "track.f32")
+    assert np.array_equal(load_track(str(tmp_path / "track.npy")), POINTS)
+    assert np.allclose(load_track(str(tmp_path / "track.f32")), POINTS)
+    with pytest.raises(ValueError, match="not a whole number"):
+        POINTS.ravel()[:-1].tofile(tmp_path / "track.bin")
+        load_track(str(tmp_path / "track.bin"))
+
+
+def test_close_tol_snaps_the_last_point(tmp_path):
+    points = np.concatenate([POINTS, [[1e-4, 0, 0]]])
+    np.save(tmp_path / "track.npy", points)
+    loaded = load_track(str(tmp_path / "track.npy"), close_tol=1e-3)
+    assert np.array_equal(loaded[-1], loaded[0])
+    assert np.array_equal(np.load(tmp_path / "track.npy"), points)
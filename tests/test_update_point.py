@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from scripts.spline import NatCubeSpline
+
+
+# a wavy loop of n points, long enough that update_point solves a window and not the whole track
+def wavy_track(n, closed):
+    a = np.linspace(0, 2*np.pi, n)
+    points = np.stack([10*np.cos(a), 10*np.sin(a), np.sin(5*a) + 0.3*np.cos(13*a)], axis=-1)
+    if not closed:
+        points = points[:-2]
+    else:
+        points[-1] = points[0]
+    return points
+
+
+@pytest.mark.parametrize("closed", [False, True])
+def test_update_point_matches_rebuild(closed):
+    rng = np.random.default_rng(7)
+    spline = NatCubeSpline(wavy_track(300, closed))
+    for frame in ("up_frame", "rmf_frame"):
+        spline.frame_table(frame)
+
+    # the ends and the seam of a loop, then anywhere
+    for i in [0, spline.N - 1, 1, 150] + list(rng.integers(0, spline.N, 4)):
+        spline.update_point(i, spline.pass_points[i] + rng.normal(0, 0.3, 3))
+    if closed:
+        assert np.array_equal(spline.pass_points[0], spline.pass_points[-1])
+    rebuilt = NatCubeSpline(spline.pass_points)
+
+    assert np.allclose(spline.control_points, rebuilt.control_points, rtol=0, atol=1e-12)
+    assert np.allclose(spline.cumulative_lengths, rebuilt.cumulative_lengths, rtol=1e-9, atol=0)
+    assert np.allclose(spline.bboxes, rebuilt.bboxes)
+    # both arc-length tables are within arclength_tol of the true lengths
+    u = rng.uniform(0, spline.umax, 10000)
+    tol = 2*spline.arclength_tol
+    assert np.allclose(spline.length_many(u), rebuilt.length_many(u), rtol=0, atol=tol)
+    s = rng.uniform(0, spline.cumulative_lengths[-1], 10000)
+    assert np.allclose(rebuilt.length_many(spline.inv_length_many(s)), s, rtol=0, atol=tol)
+    for frame in ("up_frame", "rmf_frame"):
+        assert np.allclose(spline.frame_table(frame).lookup(u), rebuilt.frame_table(frame).lookup(u), atol=1e-6)
+
+
+def test_update_point_reports_changed_ranges():
+    spline = NatCubeSpline(wavy_track(300, False))
+    before = spline.coordinates(np.linspace(0, spline.umax, 10001))
+    ranges = spline.update_point(100, spline.pass_points[100] + 1.0)
+    after = spline.coordinates(np.linspace(0, spline.umax, 10001))
+
+    u = np.linspace(0, spline.umax, 10001)
+    moved = np.any(np.abs(after - before) > 1e-12, axis=-1)
+    inside = np.any([(u >= u0) & (u <= u1) for u0, u1 in ranges], axis=0)
+    assert np.all(inside[moved])
+    # a moved point does not change the same point moved back
+    assert spline.update_point(100, spline.pass_points[100]) == []